@@ -0,0 +1,180 @@
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import numpy as np
+import pygame
+import game_loop
+
+
+class Scenario:
+    def __init__(self, name, player_ship_class, num_enemies, difficulty, projectiles):
+        self.name = name
+        self.player_ship_class = player_ship_class
+        self.num_enemies = num_enemies
+        self.difficulty = difficulty
+        self.projectiles = projectiles
+
+    @classmethod
+    def create_for_benchmark(cls, name, num_enemies, difficulty=3, projectiles=0, player_ship_class='heavy_fighter'):
+        return cls(name, player_ship_class, num_enemies, difficulty, projectiles)
+
+    def setup(self, game, seed):
+        random.seed(seed)
+        game.difficulty = self.difficulty
+        game.start_game(self.player_ship_class, self.num_enemies, seed)
+        simulation = game.simulation
+        simulation.player.hullpoints = 10 ** 9
+        for _ in range(self.projectiles):
+            angle = random.uniform(0, 360)
+            distance = random.uniform(0, 3000)
+            x = simulation.player.x + distance * math.cos(math.radians(angle))
+            y = simulation.player.y + distance * math.sin(math.radians(angle))
+            simulation.projectiles.spawn(x, y, random.uniform(0, 360), 0, 0, 10.0, 0, 600)
+
+
+class BenchmarkRunner:
+    scenarios = {
+        'enemies_10': Scenario.create_for_benchmark('enemies_10', 10),
+        'enemies_100': Scenario.create_for_benchmark('enemies_100', 100),
+        'enemies_1000': Scenario.create_for_benchmark('enemies_1000', 1000),
+        'projectile_storm': Scenario.create_for_benchmark('projectile_storm', 100, projectiles=5000),
+        'heavy_wave_d5': Scenario.create_for_benchmark('heavy_wave_d5', 300, difficulty=5),
+    }
+    player_commands = {'fire', 'turn_left'}
+
+    def __init__(self, ticks, seed, render):
+        self.ticks = ticks
+        self.seed = seed
+        self.render = render
+        self.game = game_loop.Game()
+
+    @classmethod
+    def create_from_args(cls, args):
+        return cls(args.ticks, args.seed, not args.no_render)
+
+    def run_scenario(self, scenario):
+        game = self.game
+        scenario.setup(game, self.seed)
+        simulation = game.simulation
+        timer = simulation.phase_timer
+        timer.frame = {}
+        timer.history = []
+        timer.recording = True
+
+        started = time.perf_counter()
+        for _ in range(self.ticks):
+            simulation.step(self.player_commands, game.tick_ms)
+            if self.render:
+                render_started = time.perf_counter()
+                game.draw_world()
+                timer.add('render', time.perf_counter() - render_started)
+            timer.end_frame()
+        elapsed = time.perf_counter() - started
+        timer.recording = False
+
+        return {
+            'ticks': simulation.tick,
+            'seconds': elapsed,
+            'ticks_per_sec': simulation.tick / elapsed if elapsed > 0 else 0.0,
+            'ships': len(simulation.all_ships),
+            'projectiles': len(simulation.projectiles),
+            'phases': self.summarize_phases(timer.history),
+            'ai': simulation.ai_scheduler.get_report(),
+        }
+
+    def summarize_phases(self, history):
+        phases = sorted({phase for frame in history for phase in frame})
+        summary = {}
+        for phase in phases:
+            samples = np.array([frame.get(phase, 0.0) for frame in history]) * 1000
+            summary[phase] = {
+                'mean_ms': float(samples.mean()),
+                'p95_ms': float(np.percentile(samples, 95)),
+                'max_ms': float(samples.max()),
+            }
+        return summary
+
+    def run(self, names):
+        return {
+            'meta': {
+                'seed': self.seed,
+                'ticks': self.ticks,
+                'render': self.render,
+                'python': platform.python_version(),
+                'pygame': pygame.version.ver,
+                'numpy': np.__version__,
+            },
+            'scenarios': {name: self.run_scenario(self.scenarios[name]) for name in names},
+        }
+
+
+class BaselineComparison:
+    def __init__(self, baseline, tolerance, noise_floor_ms):
+        self.baseline = baseline
+        self.tolerance = tolerance
+        self.noise_floor_ms = noise_floor_ms
+
+    @classmethod
+    def create_from_file(cls, path, tolerance, noise_floor_ms=0.05):
+        with open(path) as baseline_file:
+            return cls(json.load(baseline_file), tolerance, noise_floor_ms)
+
+    def find_regressions(self, results):
+        regressions = []
+        for name, current in results['scenarios'].items():
+            previous = self.baseline['scenarios'].get(name)
+            if previous is None:
+                continue
+            if current['ticks_per_sec'] < previous['ticks_per_sec'] * (1 - self.tolerance):
+                regressions.append((name, 'ticks_per_sec', previous['ticks_per_sec'], current['ticks_per_sec']))
+            for phase, stats in current['phases'].items():
+                if phase not in previous['phases']:
+                    continue
+                before = previous['phases'][phase]['mean_ms']
+                after = stats['mean_ms']
+                if after > before * (1 + self.tolerance) and after - before > self.noise_floor_ms:
+                    regressions.append((name, phase + '.mean_ms', before, after))
+        return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run headless Starlight Frontier performance scenarios.')
+    parser.add_argument('--scenario', action='append', choices=sorted(BenchmarkRunner.scenarios),
+                        help='scenario to run (repeatable, default: all)')
+    parser.add_argument('--ticks', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--no-render', action='store_true', help='skip the offscreen render phase')
+    parser.add_argument('--output', help='write the JSON results to this file instead of stdout')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='allowed slowdown before a regression is reported')
+    args = parser.parse_args(argv)
+
+    runner = BenchmarkRunner.create_from_args(args)
+    results = runner.run(args.scenario or list(BenchmarkRunner.scenarios))
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+    if not args.baseline:
+        return 0
+    regressions = BaselineComparison.create_from_file(args.baseline, args.tolerance).find_regressions(results)
+    for name, metric, before, after in regressions:
+        print(f'REGRESSION {name} {metric}: {before:.3f} -> {after:.3f}', file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
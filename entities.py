@@ -1,12 +1,16 @@
+import copy
+import itertools
 import math
+import numpy as np
 import pygame
 from abc import ABC, abstractmethod
 
 
 class ShipFactory:
+    templates = {}
+
     @staticmethod
-    def create_ship(x, y, faction, ship_class):
-        ship = Ship(x, y, faction)
+    def get_components(ship_class):
         components = {
             'scout': {
                 'main_thrusters': ScoutMainThrusters,
@@ -30,24 +34,153 @@ class ShipFactory:
                 'auto_pilot': AutoPilot
             }
         }
-        ship.hull = components[ship_class]['hull'].create_for_ship()
-        ship.main_thrusters = components[ship_class]['main_thrusters'].create_for_ship()
-        ship.maneuvering_thrusters = components[ship_class]['maneuvering_thrusters'].create_for_ship()
-        ship.cannon = components[ship_class]['cannon'].create_for_ship()
-        ship.auto_pilot = components[ship_class]['auto_pilot'].create_for_ship()
-        ship._get_image()
+        return components[ship_class]
+
+    @classmethod
+    def get_template(cls, ship_class, faction):
+        key = (ship_class, faction)
+        template = cls.templates.get(key)
+        if template is None:
+            template = ShipTemplate.create_for_factory(ship_class, faction, cls.get_components(ship_class))
+            cls.templates[key] = template
+        return template
+
+    @classmethod
+    def create_ship(cls, x, y, faction, ship_class):
+        return cls.get_template(ship_class, faction).create_ship(x, y)
+
+
+class ShipTemplate:
+    surface_size = {'small': 50, 'medium': 100, 'large': 200}
+
+    def __init__(self, ship_class, faction, components):
+        self.ship_class = ship_class
+        self.faction = faction
+        self.hull = components['hull'].create_for_ship()
+        self.main_thrusters = components['main_thrusters'].create_for_ship()
+        self.maneuvering_thrusters = components['maneuvering_thrusters'].create_for_ship()
+        self.cannon = components['cannon'].create_for_ship()
+        self.auto_pilot = components['auto_pilot'].create_for_ship()
+        self.stats = ShipStats.create_from_components(self.hull, self.main_thrusters, self.maneuvering_thrusters,
+                                                      self.cannon)
+        self.base_image = self._get_image(Ship.faction_colors[faction])
+        self.bounds_size = math.ceil(self.hull.radius) * 2 + 2
+
+    @classmethod
+    def create_for_factory(cls, ship_class, faction, components):
+        return cls(ship_class, faction, components)
+
+    def _get_image(self, color):
+        size = self.surface_size[self.hull.get_size()]
+        image = pygame.Surface((size, size), pygame.SRCALPHA)
+        image.fill((250, 250, 250, 0))
+        shape = [(x + size / 2, y + size / 2) for x, y in self.hull.get_shape()]
+        pygame.draw.polygon(image, color, shape)
+        return image
+
+    def create_ship(self, x, y):
+        ship = Ship(x, y, self.faction)
+        ship.ship_class = self.ship_class
+        ship.template = self
+        ship.hull = copy.copy(self.hull)
+        ship.main_thrusters = self.main_thrusters
+        ship.maneuvering_thrusters = self.maneuvering_thrusters
+        ship.cannon = copy.copy(self.cannon)
+        ship.auto_pilot = self.auto_pilot
+        ship.stats = self.stats
+        ship.base_image = self.base_image
+        ship.image = self.base_image
+        ship.rect = pygame.Rect(0, 0, self.bounds_size, self.bounds_size)
+        ship.rect.center = (ship.x, ship.y)
         return ship
 
 
+class ShipStats:
+    __slots__ = ('total_mass', 'linear_acceleration', 'side_acceleration', 'brake_deceleration',
+                 'angular_acceleration', 'max_angular_velocity', 'max_speed', 'max_speed_squared')
+
+    def __init__(self, total_mass, forward_thrust, max_speed, side_thrust, torque):
+        self.total_mass = total_mass
+        self.linear_acceleration = forward_thrust / total_mass
+        self.side_acceleration = side_thrust / total_mass
+        self.brake_deceleration = side_thrust / (1.0 + total_mass)
+        self.angular_acceleration = (torque / total_mass) / 10
+        self.max_angular_velocity = torque * 2
+        self.max_speed = max_speed
+        self.max_speed_squared = max_speed * max_speed
+
+    @classmethod
+    def create_from_components(cls, hull, main_thrusters, maneuvering_thrusters, cannon):
+        total_mass = hull.mass
+        for component in (main_thrusters, maneuvering_thrusters, cannon):
+            if component:
+                total_mass += component.mass
+        return cls(total_mass, main_thrusters.forward_thrust, main_thrusters.max_speed,
+                   maneuvering_thrusters.side_thrust, maneuvering_thrusters.torque)
+
+
+class RotatedFrame:
+    def __init__(self, image, offset):
+        self.image = image
+        self.offset = offset
+
+
+class RotationCache:
+    def __init__(self, angle_step):
+        self.angle_step = angle_step
+        self.steps = round(360 / angle_step)
+        self.frames = {}
+
+    @classmethod
+    def create_for_ships(cls, angle_step=1):
+        return cls(angle_step)
+
+    def quantize(self, angle):
+        return round(angle / self.angle_step) % self.steps
+
+    def get_frame(self, ship, angle=None):
+        if angle is None:
+            angle = ship.angle
+        key = (ship.ship_class, ship.faction, self.quantize(angle))
+        frame = self.frames.get(key)
+        if frame is None:
+            frame = self._build_frame(ship.base_image, key[2])
+            self.frames[key] = frame
+        return frame
+
+    def _build_frame(self, base_image, step):
+        image = pygame.transform.rotate(base_image, step * self.angle_step)
+        offset = (-image.get_width() / 2, -image.get_height() / 2)
+        return RotatedFrame(image, offset)
+
+
 class Ship(pygame.sprite.Sprite):
+    rotation_cache = RotationCache.create_for_ships()
+    id_counter = itertools.count(1)
+    faction_colors = {
+        'player': (0, 0, 255),
+        'enemy': (255, 0, 0),
+        'ally': (0, 255, 0)
+    }
+
     def __init__(self, x, y, faction):
         super().__init__()
+        self.ship_id = next(Ship.id_counter)
+        self.ship_class = None
+        self.template = None
         self.x = float(x)
         self.y = float(y)
         self.angle = 0
+        self.heading_cos = 1.0
+        self.heading_sin = 0.0
+        self.previous_x = self.x
+        self.previous_y = self.y
+        self.previous_angle = self.angle
         self.x_vector = 0
         self.y_vector = 0
         self.angular_velocity = 0.0
+        self.next_think_tick = 0
+        self.coast_thrust = False
         self.faction = faction
         self.color = self._get_color()
         self.main_thrusters = None
@@ -55,77 +188,79 @@ class Ship(pygame.sprite.Sprite):
         self.cannon = None
         self.hull = None
         self.auto_pilot = None
+        self.stats = None
         self.base_image = None
         self.image = None
         self.rect = None
-        self.mask = None
 
     def _get_color(self):
-        factions = {
-            'player': (0, 0, 255),
-            'enemy': (255, 0, 0),
-            'ally': (0, 255, 0)
-        }
-        return factions[self.faction]
-
-    def _get_image(self):
-        surface_size = {'small': 50, 'medium': 100, 'large': 200}
-        size = self.hull.get_size()
-        self.base_image = pygame.Surface((surface_size[size], surface_size[size]), pygame.SRCALPHA)
-        self.base_image.fill((250, 250, 250, 0))
-        shape = [(x + surface_size[size] / 2, y + surface_size[size] / 2) for x, y in self.hull.get_shape()]
-        pygame.draw.polygon(self.base_image, self.color, shape)
-        self.image = self.base_image.copy()
-        self.rect = self.image.get_rect(center=(self.x, self.y))
-        self.mask = pygame.mask.from_surface(self.image)
+        return self.faction_colors[self.faction]
 
     @classmethod
     def create(cls, x, y, faction, ship_class):
         return ShipFactory.create_ship(x, y, faction, ship_class)
 
     def get_total_mass(self):
-        total_mass = self.hull.mass
-        if self.main_thrusters:
-            total_mass += self.main_thrusters.mass
-        if self.maneuvering_thrusters:
-            total_mass += self.maneuvering_thrusters.mass
-        if self.cannon:
-            total_mass += self.cannon.mass
-        return total_mass
+        return self.stats.total_mass
+
+    def refresh_stats(self):
+        self.stats = ShipStats.create_from_components(self.hull, self.main_thrusters, self.maneuvering_thrusters,
+                                                      self.cannon)
+
+    def refresh_heading(self):
+        rad = math.radians(self.angle)
+        self.heading_cos = math.cos(rad)
+        self.heading_sin = math.sin(rad)
 
     def start_to_accelerate(self, direction):
         if direction == 'forward':
-            self.main_thrusters.accelerate(self, self.get_total_mass())
+            self.main_thrusters.accelerate(self)
             return
-        self.maneuvering_thrusters.accelerate(self, direction, self.get_total_mass())
+        self.maneuvering_thrusters.accelerate(self, direction)
 
     def start_to_brake(self):
-        self.maneuvering_thrusters.brake(self, self.get_total_mass())
+        self.maneuvering_thrusters.brake(self)
 
     def start_to_brake_rotation(self):
-        self.maneuvering_thrusters.brake_rotation(self, self.get_total_mass())
+        self.maneuvering_thrusters.brake_rotation(self)
 
     def start_to_turn(self, direction):
-        self.maneuvering_thrusters.turn(self, direction, self.get_total_mass())
+        self.maneuvering_thrusters.turn(self, direction)
 
     def move(self):
+        self.previous_x = self.x
+        self.previous_y = self.y
+        self.previous_angle = self.angle
         self.x += self.x_vector
         self.y += self.y_vector
         self.angle += self.angular_velocity
         self.angle %= 360
+        self.refresh_heading()
+
+    def get_interpolated_position(self, alpha):
+        return (self.previous_x + (self.x - self.previous_x) * alpha,
+                self.previous_y + (self.y - self.previous_y) * alpha)
+
+    def get_interpolated_angle(self, alpha):
+        delta = (self.angle - self.previous_angle + 180) % 360 - 180
+        return (self.previous_angle + delta * alpha) % 360
 
     def approach_target(self, target_x, target_y, tolerance=200):
         return self.auto_pilot.navigate_to_target(self, target_x, target_y, tolerance)
 
-    def fire(self):
-        return self.cannon.fire(self)
+    def fire(self, projectiles):
+        return self.cannon.fire(self, projectiles)
 
     def update(self, dt=0):
         self.move()
         self.cannon.update(dt)
-        self.image = pygame.transform.rotate(self.base_image, self.angle)
-        self.rect = self.image.get_rect(center=(self.x, self.y))
-        self.mask = pygame.mask.from_surface(self.image)
+        self.rect.center = (self.x, self.y)
+
+    def get_frame(self, angle=None):
+        return self.rotation_cache.get_frame(self, angle)
+
+    def get_world_shape(self):
+        return self.hull.get_world_shape(self.x, self.y, self.angle)
 
     @property
     def hullpoints(self):
@@ -140,7 +275,7 @@ class Ship(pygame.sprite.Sprite):
         return {
             'hardpoints': self.hull.hardpoints,
             'max_hullpoints': self.hull.max_hullpoints,
-            'total_mass': self.get_total_mass()
+            'total_mass': self.stats.total_mass
         }
 
 
@@ -155,18 +290,16 @@ class MainThrusters(ABC):
     def create_for_ship(cls):
         pass
 
-    def accelerate(self, ship, total_mass):
-        acceleration = self.forward_thrust / total_mass
-        ax = math.cos(math.radians(ship.angle)) * acceleration
-        ay = -math.sin(math.radians(ship.angle)) * acceleration
-        ship.x_vector += ax
-        ship.y_vector += ay
+    def accelerate(self, ship):
+        acceleration = ship.stats.linear_acceleration
+        ship.x_vector += ship.heading_cos * acceleration
+        ship.y_vector -= ship.heading_sin * acceleration
         self._clamp_speed(ship)
 
     def _clamp_speed(self, ship):
-        speed = math.sqrt(ship.x_vector ** 2 + ship.y_vector ** 2)
-        if speed > self.max_speed:
-            scale = self.max_speed / speed
+        speed_squared = ship.x_vector * ship.x_vector + ship.y_vector * ship.y_vector
+        if speed_squared > ship.stats.max_speed_squared:
+            scale = ship.stats.max_speed / math.sqrt(speed_squared)
             ship.x_vector *= scale
             ship.y_vector *= scale
 
@@ -200,49 +333,49 @@ class ManeuveringThrusters(ABC):
     def create_for_ship(cls):
         pass
 
-    def accelerate(self, ship, direction, total_mass):
-        direction_vectors = {
-            'left': (-math.sin(math.radians(ship.angle)), -math.cos(math.radians(ship.angle))),
-            'right': (math.sin(math.radians(ship.angle)), math.cos(math.radians(ship.angle))),
-            'backward': (-math.cos(math.radians(ship.angle)), math.sin(math.radians(ship.angle)))
-        }
-        if direction not in direction_vectors:
+    def accelerate(self, ship, direction):
+        if direction == 'left':
+            ax, ay = -ship.heading_sin, -ship.heading_cos
+        elif direction == 'right':
+            ax, ay = ship.heading_sin, ship.heading_cos
+        elif direction == 'backward':
+            ax, ay = -ship.heading_cos, ship.heading_sin
+        else:
             return
-        ax, ay = direction_vectors[direction]
-        acceleration = self.side_thrust / total_mass
+        acceleration = ship.stats.side_acceleration
         ship.x_vector += ax * acceleration
         ship.y_vector += ay * acceleration
-        speed = math.sqrt(ship.x_vector ** 2 + ship.y_vector ** 2)
-        if speed <= ship.main_thrusters.max_speed:
+        speed_squared = ship.x_vector * ship.x_vector + ship.y_vector * ship.y_vector
+        if speed_squared <= ship.stats.max_speed_squared:
             return
-        scale = ship.main_thrusters.max_speed / speed
+        scale = ship.stats.max_speed / math.sqrt(speed_squared)
         ship.x_vector *= scale
         ship.y_vector *= scale
 
-    def turn(self, ship, direction, total_mass):
-        angular_acceleration = (self.torque / total_mass) / 10
+    def turn(self, ship, direction):
+        angular_acceleration = ship.stats.angular_acceleration
         if direction == 'left':
             ship.angular_velocity += angular_acceleration
         if direction == 'right':
             ship.angular_velocity -= angular_acceleration
-        max_angular_velocity = self.torque * 2
+        max_angular_velocity = ship.stats.max_angular_velocity
         ship.angular_velocity = max(min(ship.angular_velocity, max_angular_velocity), -max_angular_velocity)
 
-    def brake_rotation(self, ship, total_mass):
-        angular_acceleration = (self.torque / total_mass) / 10
+    def brake_rotation(self, ship):
+        angular_acceleration = ship.stats.angular_acceleration
         if ship.angular_velocity > 0:
             ship.angular_velocity = max(ship.angular_velocity - angular_acceleration, 0)
         if ship.angular_velocity < 0:
             ship.angular_velocity = min(ship.angular_velocity + angular_acceleration, 0)
 
-    def brake(self, ship, total_mass):
+    def brake(self, ship):
         speed = math.sqrt(ship.x_vector ** 2 + ship.y_vector ** 2)
         if speed > 0:
-            resistance_factor = 1.0 / (1.0 + total_mass)
-            reduction_factor = (self.side_thrust * 5.0 / speed) * resistance_factor
+            brake_deceleration = ship.stats.brake_deceleration
+            reduction_factor = brake_deceleration * 5.0 / speed
             ship.x_vector -= ship.x_vector * reduction_factor
             ship.y_vector -= ship.y_vector * reduction_factor
-            if speed < self.side_thrust * resistance_factor * 2.0:
+            if speed < brake_deceleration * 2.0:
                 ship.x_vector = 0
                 ship.y_vector = 0
 
@@ -266,9 +399,10 @@ class HeavyFighterManeuveringThrusters(ManeuveringThrusters):
 
 
 class Cannon(ABC):
-    def __init__(self, shoot_delay, projectile_speed, mass):
+    def __init__(self, shoot_delay, projectile_speed, mass, projectile_range=6000):
         self.shoot_delay = shoot_delay
         self.projectile_speed = projectile_speed
+        self.projectile_range = projectile_range
         self.mass = mass
         self.shoot_cooldown = 0
 
@@ -277,22 +411,21 @@ class Cannon(ABC):
     def create_for_ship(cls):
         pass
 
-    def fire(self, ship):
+    def fire(self, ship, projectiles):
         if self.shoot_cooldown > 0:
-            return []
-        projectiles = []
-        rad = math.radians(ship.angle)
-        cos_a = math.cos(rad)
-        sin_a = math.sin(rad)
+            return 0
+        ttl = self.projectile_range / self.projectile_speed
+        cos_a = ship.heading_cos
+        sin_a = ship.heading_sin
         for hp_x, hp_y in ship.hull.hardpoints:
             offset_x = hp_x * cos_a - hp_y * sin_a
             offset_y = hp_x * sin_a + hp_y * cos_a
             start_x = ship.x + offset_x
             start_y = ship.y - offset_y
-            proj = Projectile.create(start_x, start_y, ship.angle, ship.x_vector, ship.y_vector, self.projectile_speed)
-            projectiles.append(proj)
+            projectiles.spawn(start_x, start_y, ship.angle, ship.x_vector, ship.y_vector,
+                              self.projectile_speed, ship.ship_id, ttl)
         self.shoot_cooldown = self.shoot_delay
-        return projectiles
+        return len(ship.hull.hardpoints)
 
     def update(self, dt):
         if self.shoot_cooldown > 0:
@@ -327,6 +460,7 @@ class Hull(ABC):
         self.hardpoints = hardpoints
         self.shape = shape
         self.size = size
+        self.radius = max(math.hypot(x, y) for x, y in shape)
 
     @classmethod
     @abstractmethod
@@ -339,6 +473,12 @@ class Hull(ABC):
     def get_size(self):
         return self.size
 
+    def get_world_shape(self, x, y, angle):
+        rad = math.radians(angle)
+        cos_a = math.cos(rad)
+        sin_a = math.sin(rad)
+        return [(x + px * cos_a + py * sin_a, y - px * sin_a + py * cos_a) for px, py in self.shape]
+
     @property
     def hullpoints(self):
         return self._hullpoints
@@ -399,7 +539,7 @@ class AutoPilot:
         return distance, angle_diff
 
     def should_brake(self, ship, distance, tolerance):
-        acceleration = ship.maneuvering_thrusters.side_thrust / ship.ship_stats['total_mass']
+        acceleration = ship.stats.side_acceleration
         speed = math.sqrt(ship.x_vector ** 2 + ship.y_vector ** 2)
 
         if speed == 0:
@@ -411,7 +551,7 @@ class AutoPilot:
         return time_to_target <= time_to_stop
 
     def should_brake_rotation(self, ship, angle_diff):
-        angular_acceleration = (ship.maneuvering_thrusters.torque / ship.ship_stats['total_mass']) / 10
+        angular_acceleration = ship.stats.angular_acceleration
         current_vel = abs(ship.angular_velocity)
 
         if current_vel == 0:
@@ -454,47 +594,224 @@ class AutoPilot:
         return distance, alignment
 
 
-class Projectile(pygame.sprite.Sprite):
-    def __init__(self, x, y, angle, x_vector, y_vector, speed):
-        super().__init__()
-        self.x = float(x)
-        self.y = float(y)
-        self.angle = angle
-        self.x_vector = x_vector
-        self.y_vector = y_vector
-        self.speed = speed
-        self.base_image = None
-        self.image = None
-        self.rect = None
-        self.mask = None
-        self.get_image()
-        self.add_speed_vector()
+class FleetAutoPilot:
 
     @classmethod
-    def create(cls, x, y, angle, x_vector, y_vector, speed):
-        return cls(x, y, angle, x_vector, y_vector, speed)
-
-    def get_image(self):
-        self.base_image = pygame.Surface((10, 10), pygame.SRCALPHA)
-        self.base_image.fill((0, 0, 0, 0))
-        start_pos = (7.5, 5)
-        end_pos = (2.5, 5)
-        pygame.draw.line(self.base_image, (255, 255, 0), start_pos, end_pos, 2)
-        self.image = self.base_image.copy()
-        self.rect = self.image.get_rect(center=(self.x, self.y))
-        self.mask = pygame.mask.from_surface(self.image)
-
-    def add_speed_vector(self):
-        rad = math.radians(self.angle)
-        self.x_vector += self.speed * math.cos(rad)
-        self.y_vector -= self.speed * math.sin(rad)
+    def create_for_simulation(cls):
+        return cls()
+
+    def get_fleet_state(self, ships):
+        state = np.array([
+            (ship.x, ship.y, ship.x_vector, ship.y_vector, ship.angle, ship.angular_velocity,
+             ship.heading_cos, ship.heading_sin, ship.stats.linear_acceleration, ship.stats.side_acceleration,
+             ship.stats.brake_deceleration, ship.stats.angular_acceleration, ship.stats.max_angular_velocity,
+             ship.stats.max_speed)
+            for ship in ships
+        ], dtype=float).reshape(-1, 14)
+        return state.T
+
+    def _clamp_speed(self, x_vector, y_vector, max_speed, mask):
+        speed = np.hypot(x_vector, y_vector)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scale = np.where(mask & (speed > max_speed), max_speed / speed, 1.0)
+        return x_vector * scale, y_vector * scale
+
+    def coast(self, ships):
+        x_vector, y_vector, cos_a, sin_a, linear_acceleration, max_speed = np.array([
+            (ship.x_vector, ship.y_vector, ship.heading_cos, ship.heading_sin, ship.stats.linear_acceleration,
+             ship.stats.max_speed)
+            for ship in ships
+        ], dtype=float).reshape(-1, 6).T
+        x_vector, y_vector = self._clamp_speed(x_vector + cos_a * linear_acceleration,
+                                               y_vector - sin_a * linear_acceleration, max_speed, True)
+        for ship, ship_x_vector, ship_y_vector in zip(ships, x_vector.tolist(), y_vector.tolist()):
+            ship.x_vector = ship_x_vector
+            ship.y_vector = ship_y_vector
+
+    def navigate_to_target(self, ships, target_x, target_y, tolerance=200):
+        (x, y, x_vector, y_vector, angle, angular_velocity, cos_a, sin_a, linear_acceleration, side_acceleration,
+         brake_deceleration, angular_acceleration, max_angular_velocity, max_speed) = self.get_fleet_state(ships)
+
+        delta_x = target_x - x
+        delta_y = target_y - y
+        distance = np.hypot(delta_x, delta_y)
+        target_angle = np.degrees(np.arctan2(-delta_y, delta_x)) + 180
+        angle_diff = (target_angle - angle + 180) % 360
+
+        current_vel = np.abs(angular_velocity)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            brake_rotation = np.where(current_vel == 0, np.abs(angle_diff) < 2,
+                                      np.abs(angle_diff) / current_vel <= current_vel / angular_acceleration)
+        angular_velocity = np.where(brake_rotation & (angular_velocity > 0),
+                                    np.maximum(angular_velocity - angular_acceleration, 0), angular_velocity)
+        angular_velocity = np.where(brake_rotation & (angular_velocity < 0),
+                                    np.minimum(angular_velocity + angular_acceleration, 0), angular_velocity)
+
+        speed = np.hypot(x_vector, y_vector)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            brake = np.where(speed == 0, distance < tolerance,
+                             (distance - tolerance) / speed <= speed / side_acceleration) & (speed > 0)
+            reduction_factor = np.where(brake, brake_deceleration * 5.0 / speed, 0.0)
+        x_vector = x_vector - x_vector * reduction_factor
+        y_vector = y_vector - y_vector * reduction_factor
+        stop = brake & (speed < brake_deceleration * 2.0)
+        x_vector[stop] = 0
+        y_vector[stop] = 0
+
+        alignment = np.minimum(angle_diff, 360 - angle_diff) / 180
+        turn_right = angle_diff > 180
+        turn_left = angle_diff < 180
+        strafe = (alignment > 0.5) & (turn_right | turn_left)
+        strafe_direction = np.where(turn_right, -1.0, 1.0) * strafe
+        x_vector = x_vector + strafe_direction * sin_a * side_acceleration
+        y_vector = y_vector + strafe_direction * cos_a * side_acceleration
+        x_vector, y_vector = self._clamp_speed(x_vector, y_vector, max_speed, strafe)
+
+        angular_velocity = angular_velocity + angular_acceleration * (turn_left.astype(float) - turn_right)
+        angular_velocity = np.where(turn_left | turn_right,
+                                    np.clip(angular_velocity, -max_angular_velocity, max_angular_velocity),
+                                    angular_velocity)
+
+        forward = (distance > tolerance) & (alignment <= 0.5)
+        forward_acceleration = np.where(forward, linear_acceleration, 0.0)
+        x_vector = x_vector + cos_a * forward_acceleration
+        y_vector = y_vector - sin_a * forward_acceleration
+        x_vector, y_vector = self._clamp_speed(x_vector, y_vector, max_speed, forward)
+
+        for ship, ship_x_vector, ship_y_vector, ship_angular_velocity in zip(
+                ships, x_vector.tolist(), y_vector.tolist(), angular_velocity.tolist()):
+            ship.x_vector = ship_x_vector
+            ship.y_vector = ship_y_vector
+            ship.angular_velocity = ship_angular_velocity
+
+        return distance, alignment, forward
+
+
+class ProjectileSystem:
+    radius = 2.5
+    fields = ('x', 'y', 'x_vector', 'y_vector', 'angle', 'frame', 'owner', 'ttl', 'active')
+
+    def __init__(self, world_width, world_height, capacity, angle_step):
+        self.world_width = world_width
+        self.world_height = world_height
+        self.angle_step = angle_step
+        self.capacity = 0
+        self.high_water = 0
+        self.free_slots = []
+        self.spawned = []
+        self.x = np.zeros(0)
+        self.y = np.zeros(0)
+        self.x_vector = np.zeros(0)
+        self.y_vector = np.zeros(0)
+        self.angle = np.zeros(0)
+        self.frame = np.zeros(0, dtype=np.intp)
+        self.owner = np.zeros(0, dtype=np.int64)
+        self.ttl = np.zeros(0)
+        self.active = np.zeros(0, dtype=bool)
+        self._allocate(capacity)
+        self.frames, self.frame_offsets = self._get_frames()
+
+    @classmethod
+    def create_for_gameloop(cls, world_width, world_height, capacity=4096, angle_step=1):
+        return cls(world_width, world_height, capacity, angle_step)
+
+    def _allocate(self, capacity):
+        for name in self.fields:
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+        self.free_slots.extend(range(capacity - 1, self.capacity - 1, -1))
+        self.capacity = capacity
+
+    def _get_frames(self):
+        base_image = pygame.Surface((10, 10), pygame.SRCALPHA)
+        base_image.fill((0, 0, 0, 0))
+        pygame.draw.line(base_image, (255, 255, 0), (7.5, 5), (2.5, 5), 2)
+        frames = []
+        offsets = []
+        for step in range(round(360 / self.angle_step)):
+            image = pygame.transform.rotate(base_image, step * self.angle_step)
+            frames.append(image)
+            offsets.append((-image.get_width() / 2, -image.get_height() / 2))
+        return frames, np.array(offsets)
+
+    def __len__(self):
+        return self.capacity - len(self.free_slots)
+
+    def spawn(self, x, y, angle, x_vector, y_vector, speed, owner, ttl):
+        if not self.free_slots:
+            self._allocate(self.capacity * 2)
+        slot = self.free_slots.pop()
+        rad = math.radians(angle)
+        self.x[slot] = x
+        self.y[slot] = y
+        self.x_vector[slot] = x_vector + speed * math.cos(rad)
+        self.y_vector[slot] = y_vector - speed * math.sin(rad)
+        self.angle[slot] = angle
+        self.frame[slot] = round(angle / self.angle_step) % len(self.frames)
+        self.owner[slot] = owner
+        self.ttl[slot] = ttl
+        self.active[slot] = True
+        self.high_water = max(self.high_water, slot + 1)
+        self.spawned.append(slot)
+        return slot
+
+    def take_spawned(self):
+        spawned = np.array(self.spawned, dtype=np.intp)
+        self.spawned.clear()
+        return spawned
+
+    def active_slots(self):
+        return np.flatnonzero(self.active[:self.high_water])
+
+    def kill(self, slots):
+        slots = np.unique(np.asarray(slots, dtype=np.intp))
+        slots = slots[self.active[slots]]
+        self.active[slots] = False
+        self.free_slots.extend(slots.tolist())
+
+    def empty(self):
+        self.active[:] = False
+        self.free_slots = list(range(self.capacity - 1, -1, -1))
+        self.spawned.clear()
+        self.high_water = 0
+
+    def restore(self, capacity, high_water, free_slots, spawned, columns):
+        for name, column in zip(self.fields, columns):
+            array = np.zeros(capacity, dtype=getattr(self, name).dtype)
+            array[:high_water] = column
+            setattr(self, name, array)
+        self.capacity = capacity
+        self.high_water = high_water
+        self.free_slots = list(free_slots)
+        self.spawned = list(spawned)
 
     def move(self):
-        self.x += self.x_vector
-        self.y += self.y_vector
+        live = slice(0, self.high_water)
+        self.x[live] += self.x_vector[live]
+        self.y[live] += self.y_vector[live]
+        self.ttl[live] -= 1
+
+    def cull(self):
+        live = slice(0, self.high_water)
+        x = self.x[live]
+        y = self.y[live]
+        expired = (self.ttl[live] <= 0) | (x < 0) | (x > self.world_width) | (y < 0) | (y > self.world_height)
+        self.kill(np.flatnonzero(expired & self.active[live]))
 
     def update(self):
         self.move()
-        self.image = pygame.transform.rotate(self.base_image, self.angle)
-        self.rect = self.image.get_rect(center=(self.x, self.y))
-        self.mask = pygame.mask.from_surface(self.image)
+        self.cull()
+
+    def draw(self, screen, camera_x, camera_y, alpha=1.0, return_rects=False):
+        slots = self.active_slots()
+        frame = self.frame[slots]
+        lag = 1.0 - alpha
+        left = self.x[slots] - self.x_vector[slots] * lag - camera_x + self.frame_offsets[frame, 0]
+        top = self.y[slots] - self.y_vector[slots] * lag - camera_y + self.frame_offsets[frame, 1]
+        screen_width, screen_height = screen.get_size()
+        visible = (left > -20) & (left < screen_width) & (top > -20) & (top < screen_height)
+        frames = self.frames
+        return screen.blits([(frames[f], (px, py)) for f, px, py in
+                             zip(frame[visible].tolist(), left[visible].tolist(), top[visible].tolist())], return_rects)
@@ -1,5 +1,10 @@
+import collections
+import cProfile
+import csv
 import math
 import random
+import time
+import numpy as np
 import pygame
 
 
@@ -10,92 +15,431 @@ class Camera:
         self.player = player
         self.x = None
         self.y = None
+        self.alpha = 1.0
 
     @classmethod
     def create_for_gameloop(cls, screen_width, screen_height, player):
         return cls(screen_width, screen_height, player)
 
     def get_ship_screen_coordinates(self, ship):
-        screen_x = ship.x - self.x
-        screen_y = ship.y - self.y
+        ship_x, ship_y = ship.get_interpolated_position(self.alpha)
+        screen_x = ship_x - self.x
+        screen_y = ship_y - self.y
         return [screen_x, screen_y]
 
     def get_multiple_ship_screen_coordinates(self, ships):
         return {ship: self.get_ship_screen_coordinates(ship) for ship in ships}
 
-    def update(self, world_width, world_height):
-        self.x = self.player.x - self.screen_width / 2
-        self.y = self.player.y - self.screen_height / 2
+    def get_visible_ships(self, ships):
+        visible = []
+        for ship in ships:
+            screen_x, screen_y = self.get_ship_screen_coordinates(ship)
+            margin = ship.hull.radius + 1
+            if -margin <= screen_x <= self.screen_width + margin and -margin <= screen_y <= self.screen_height + margin:
+                visible.append((ship, screen_x, screen_y))
+        return visible
+
+    def update(self, world_width, world_height, alpha=1.0):
+        self.alpha = alpha
+        player_x, player_y = self.player.get_interpolated_position(alpha)
+        self.x = player_x - self.screen_width / 2
+        self.y = player_y - self.screen_height / 2
         self.x = max(0, min(self.x, world_width - self.screen_width))
         self.y = max(0, min(self.y, world_height - self.screen_height))
 
 
+class SpatialGrid:
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = {}
+
+    @classmethod
+    def create_for_physics(cls, cell_size=128):
+        return cls(cell_size)
+
+    def _cell_range(self, rect):
+        return (rect.left // self.cell_size, rect.right // self.cell_size,
+                rect.top // self.cell_size, rect.bottom // self.cell_size)
+
+    def rebuild(self, sprites):
+        self.cells.clear()
+        for sprite in sprites:
+            left, right, top, bottom = self._cell_range(sprite.rect)
+            for cx in range(left, right + 1):
+                for cy in range(top, bottom + 1):
+                    cell = self.cells.get((cx, cy))
+                    if cell is None:
+                        self.cells[(cx, cy)] = [sprite]
+                    else:
+                        cell.append(sprite)
+
+    def candidate_pairs(self):
+        pairs = []
+        for (cx, cy), cell in self.cells.items():
+            for i, sprite1 in enumerate(cell):
+                rect1 = sprite1.rect
+                for sprite2 in cell[i + 1:]:
+                    rect2 = sprite2.rect
+                    if not rect1.colliderect(rect2):
+                        continue
+                    if max(rect1.left, rect2.left) // self.cell_size != cx:
+                        continue
+                    if max(rect1.top, rect2.top) // self.cell_size != cy:
+                        continue
+                    pairs.append((sprite1, sprite2))
+        return pairs
+
+
+class SweepAndPrune:
+    def __init__(self):
+        self.order = np.zeros(0, dtype=np.intp)
+        self.sorted_x = np.zeros(0)
+
+    @classmethod
+    def create_for_physics(cls):
+        return cls()
+
+    def update(self, projectiles):
+        order = self.order[projectiles.active[self.order]]
+        spawned = projectiles.take_spawned()
+        spawned = spawned[projectiles.active[spawned]]
+        if len(spawned):
+            order = np.concatenate((order[~np.isin(order, spawned)], spawned))
+        order = order[np.argsort(projectiles.x[order], kind='stable')]
+        self.order = order
+        self.sorted_x = projectiles.x[order]
+
+    def query_ranges(self, min_x, max_x):
+        return np.searchsorted(self.sorted_x, min_x, side='left'), np.searchsorted(self.sorted_x, max_x, side='left')
+
+    def overlapping_pairs(self, projectiles, reach):
+        sorted_x = self.sorted_x
+        count = len(sorted_x)
+        ends = np.searchsorted(sorted_x, sorted_x + reach, side='right')
+        counts = ends - np.arange(count) - 1
+        total = counts.sum()
+        if total == 0:
+            return self.order[:0], self.order[:0]
+        first = np.repeat(np.arange(count), counts)
+        starts = np.repeat(np.cumsum(counts) - counts, counts)
+        second = first + 1 + np.arange(total) - starts
+        first = self.order[first]
+        second = self.order[second]
+        dx = projectiles.x[first] - projectiles.x[second]
+        dy = projectiles.y[first] - projectiles.y[second]
+        hit = (dx * dx + dy * dy <= reach * reach) & projectiles.active[first] & projectiles.active[second]
+        return first[hit], second[hit]
+
+
+class FactionGrid:
+    def __init__(self, ships, cell_size):
+        self.ships = ships
+        self.cell_size = cell_size
+        self.positions = np.array([(ship.x, ship.y) for ship in ships], dtype=float).reshape(-1, 2)
+        cells = np.floor(self.positions / cell_size).astype(np.int64)
+        keys = (cells[:, 0] << 32) + cells[:, 1]
+        order = np.argsort(keys, kind='stable')
+        unique_keys, starts = np.unique(keys[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+        unique_cells = cells[order[starts]]
+        self.cells = {(cell_x, cell_y): order[start:end] for (cell_x, cell_y), start, end
+                      in zip(unique_cells.tolist(), starts.tolist(), ends.tolist())}
+        if len(unique_cells):
+            self.min_cell = unique_cells.min(axis=0).tolist()
+            self.max_cell = unique_cells.max(axis=0).tolist()
+        else:
+            self.min_cell = self.max_cell = [0, 0]
+
+    @classmethod
+    def create_for_index(cls, ships, cell_size):
+        return cls(ships, cell_size)
+
+    def __len__(self):
+        return len(self.ships)
+
+    def _gather(self, cell_keys):
+        indices = [self.cells[key] for key in cell_keys if key in self.cells]
+        return np.concatenate(indices) if indices else np.zeros(0, dtype=np.intp)
+
+    def _ring(self, cell_x, cell_y, ring):
+        if ring == 0:
+            return [(cell_x, cell_y)]
+        keys = [(x, cell_y - ring) for x in range(cell_x - ring, cell_x + ring + 1)]
+        keys += [(x, cell_y + ring) for x in range(cell_x - ring, cell_x + ring + 1)]
+        keys += [(cell_x - ring, y) for y in range(cell_y - ring + 1, cell_y + ring)]
+        keys += [(cell_x + ring, y) for y in range(cell_y - ring + 1, cell_y + ring)]
+        return keys
+
+    def within_radius(self, x, y, radius):
+        cell_size = self.cell_size
+        left, right = math.floor((x - radius) / cell_size), math.floor((x + radius) / cell_size)
+        top, bottom = math.floor((y - radius) / cell_size), math.floor((y + radius) / cell_size)
+        if (right - left + 1) * (bottom - top + 1) > len(self.cells):
+            candidates = self._gather(key for key in self.cells
+                                      if left <= key[0] <= right and top <= key[1] <= bottom)
+        else:
+            candidates = self._gather((cell_x, cell_y) for cell_x in range(left, right + 1)
+                                      for cell_y in range(top, bottom + 1))
+        offsets = self.positions[candidates] - (x, y)
+        distance = np.hypot(offsets[:, 0], offsets[:, 1])
+        inside = distance <= radius
+        return candidates[inside], distance[inside]
+
+    def nearest(self, x, y, k, max_distance=math.inf):
+        cell_size = self.cell_size
+        cell_x = math.floor(x / cell_size)
+        cell_y = math.floor(y / cell_size)
+        last_ring = max(abs(cell_x - self.min_cell[0]), abs(cell_x - self.max_cell[0]),
+                        abs(cell_y - self.min_cell[1]), abs(cell_y - self.max_cell[1]))
+        found = []
+        ring = 0
+        while ring <= last_ring:
+            found.append(self._gather(self._ring(cell_x, cell_y, ring)))
+            covered = ring * cell_size
+            if covered >= max_distance or sum(len(indices) for indices in found) >= k:
+                candidates = np.concatenate(found)
+                offsets = self.positions[candidates] - (x, y)
+                distance = np.hypot(offsets[:, 0], offsets[:, 1])
+                if covered >= max_distance or np.count_nonzero(distance <= covered) >= k:
+                    break
+            ring += 1
+        candidates = np.concatenate(found) if found else np.zeros(0, dtype=np.intp)
+        offsets = self.positions[candidates] - (x, y)
+        distance = np.hypot(offsets[:, 0], offsets[:, 1])
+        order = np.argsort(distance, kind='stable')[:k]
+        order = order[distance[order] <= max_distance]
+        return candidates[order], distance[order]
+
+
+class SpatialIndex:
+    brute_force_limit = 2048
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.ships = []
+        self.grids = {}
+
+    @classmethod
+    def create_for_simulation(cls, cell_size=512):
+        return cls(cell_size)
+
+    def rebuild(self, ships):
+        self.ships = list(ships)
+        self.grids = {}
+
+    def get_grid(self, faction):
+        grid = self.grids.get(faction)
+        if grid is None:
+            grid = FactionGrid.create_for_index([ship for ship in self.ships if ship.faction == faction],
+                                                self.cell_size)
+            self.grids[faction] = grid
+        return grid
+
+    def _grids(self, factions):
+        return [grid for grid in (self.get_grid(faction) for faction in factions) if len(grid)]
+
+    def count(self, factions):
+        return sum(len(self.get_grid(faction)) for faction in factions)
+
+    def nearest(self, x, y, factions, k=1, max_distance=math.inf):
+        results = []
+        for grid in self._grids(factions):
+            indices, distance = grid.nearest(x, y, k, max_distance)
+            results.extend(zip(distance.tolist(), [grid.ships[index] for index in indices.tolist()]))
+        results.sort(key=lambda result: result[0])
+        return results[:k]
+
+    def within_radius(self, x, y, radius, factions):
+        results = []
+        for grid in self._grids(factions):
+            indices, distance = grid.within_radius(x, y, radius)
+            results.extend(zip(distance.tolist(), [grid.ships[index] for index in indices.tolist()]))
+        results.sort(key=lambda result: result[0])
+        return results
+
+    def within_cone(self, x, y, direction_x, direction_y, radius, half_angle, factions):
+        min_cos = math.cos(math.radians(half_angle))
+        results = []
+        for grid in self._grids(factions):
+            indices, distance = grid.within_radius(x, y, radius)
+            offsets = grid.positions[indices] - (x, y)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                cos = (offsets[:, 0] * direction_x + offsets[:, 1] * direction_y) / distance
+            inside = (distance == 0) | (cos >= min_cos)
+            results.extend(zip(distance[inside].tolist(), [grid.ships[index] for index in indices[inside].tolist()]))
+        results.sort(key=lambda result: result[0])
+        return results
+
+    def nearest_positions(self, xs, ys, factions):
+        grids = self._grids(factions)
+        positions = np.concatenate([grid.positions for grid in grids]) if grids else np.zeros((0, 2))
+        target_x = np.full(len(xs), np.nan)
+        target_y = np.full(len(xs), np.nan)
+        if len(positions) == 0:
+            return target_x, target_y
+        if len(positions) <= self.brute_force_limit:
+            offsets_x = np.subtract.outer(xs, positions[:, 0])
+            offsets_y = np.subtract.outer(ys, positions[:, 1])
+            nearest = np.argmin(offsets_x * offsets_x + offsets_y * offsets_y, axis=1)
+            return positions[nearest, 0], positions[nearest, 1]
+        for row, (x, y) in enumerate(zip(np.asarray(xs).tolist(), np.asarray(ys).tolist())):
+            results = self.nearest(x, y, factions)
+            if results:
+                target_x[row] = results[0][1].x
+                target_y[row] = results[0][1].y
+        return target_x, target_y
+
+
 class Physics:
     def __init__(self, world_width, world_height):
         self.world_width = world_width
         self.world_height = world_height
+        self.ship_grid = SpatialGrid.create_for_physics()
+        self.projectile_sweep = SweepAndPrune.create_for_physics()
 
     @classmethod
     def create_for_gameloop(cls, world_width, world_height):
         return cls(world_width, world_height)
 
     def check_for_ship_collision(self, all_ships):
-        for ship1 in all_ships:
-            self.check_world_bounds(ship1)
-            rect_collisions = pygame.sprite.spritecollide(ship1, all_ships, False, pygame.sprite.collide_rect)
-            for ship2 in rect_collisions:
-                if ship1 != ship2:
-                    if pygame.sprite.collide_mask(ship1, ship2):
-                        self.resolve_ship_collision(ship1, ship2)
-
-    def resolve_ship_collision(self, ship1, ship2):
+        for ship in all_ships:
+            self.check_world_bounds(ship)
+        self.ship_grid.rebuild(all_ships)
+        for ship1, ship2 in self.ship_grid.candidate_pairs():
+            contact = self.ship_contact(ship1, ship2)
+            if contact is not None:
+                self.resolve_ship_collision(ship1, ship2, *contact)
+
+    def ship_contact(self, ship1, ship2):
         dx = ship2.x - ship1.x
         dy = ship2.y - ship1.y
-        distance = math.sqrt(dx ** 2 + dy ** 2)
+        reach = ship1.hull.radius + ship2.hull.radius
+        if dx * dx + dy * dy >= reach * reach:
+            return None
 
-        if distance == 0:
-            dx = random.uniform(-1, 1)
-            dy = random.uniform(-1, 1)
-            distance = 1
+        shape1 = ship1.get_world_shape()
+        shape2 = ship2.get_world_shape()
+        depth = math.inf
+        normal = None
+        for shape in (shape1, shape2):
+            for (a_x, a_y), (b_x, b_y) in zip(shape, shape[1:] + shape[:1]):
+                axis_x = a_y - b_y
+                axis_y = b_x - a_x
+                length = math.hypot(axis_x, axis_y)
+                axis_x /= length
+                axis_y /= length
+                projection1 = [x * axis_x + y * axis_y for x, y in shape1]
+                projection2 = [x * axis_x + y * axis_y for x, y in shape2]
+                forward = max(projection1) - min(projection2)
+                backward = max(projection2) - min(projection1)
+                if forward <= 0 or backward <= 0:
+                    return None
+                if forward < depth:
+                    depth = forward
+                    normal = (axis_x, axis_y)
+                if backward < depth:
+                    depth = backward
+                    normal = (-axis_x, -axis_y)
+        return normal[0], normal[1], depth
 
-        nx = dx / distance
-        ny = dy / distance
+    def resolve_ship_collision(self, ship1, ship2, normal_x, normal_y, depth):
+        push = depth / 2
+        ship1.x -= normal_x * push
+        ship1.y -= normal_y * push
+        ship2.x += normal_x * push
+        ship2.y += normal_y * push
 
-        min_distance = 25
+        ship1.rect.center = (ship1.x, ship1.y)
+        ship2.rect.center = (ship2.x, ship2.y)
 
-        overlap = min_distance - distance
-        if overlap > 0:
-            push = overlap / 2
-            ship1.x -= nx * push
-            ship1.y -= ny * push
-            ship2.x += nx * push
-            ship2.y += ny * push
+    def check_for_projectile_collisions(self, projectiles, all_ships):
+        sweep = self.projectile_sweep
+        sweep.update(projectiles)
+        if len(sweep.order) == 0:
+            return projectiles.owner[:0]
+        reach = np.abs(projectiles.x_vector[sweep.order]).max()
 
-            ship1.rect.center = (ship1.x, ship1.y)
-            ship2.rect.center = (ship2.x, ship2.y)
+        ships = list(all_ships)
+        bounds = np.array([(ship.x, ship.y, ship.hull.radius + abs(ship.x_vector) + abs(ship.y_vector), ship.ship_id) for ship in ships]).reshape(-1, 4)
+        ship_x, ship_y, extent, ship_ids = bounds.T
+        starts, ends = sweep.query_ranges(ship_x - extent - reach, ship_x + extent + reach)
+        counts = ends - starts
+        total = counts.sum()
+        pair_ships = np.repeat(np.arange(len(ships)), counts)
+        pair_slots = sweep.order[np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)]
+        end_y = projectiles.y[pair_slots]
+        start_y = end_y - projectiles.y_vector[pair_slots]
+        near = (projectiles.active[pair_slots] & (projectiles.owner[pair_slots] != ship_ids[pair_ships])
+                & (np.minimum(start_y, end_y) <= ship_y[pair_ships] + extent[pair_ships])
+                & (np.maximum(start_y, end_y) >= ship_y[pair_ships] - extent[pair_ships]))
+        pair_ships = pair_ships[near]
+        pair_slots = pair_slots[near]
 
-    def check_for_projectile_collisions(self, projectiles, all_ships):
-        proj_list = list(projectiles)
-        for i, proj1 in enumerate(proj_list):
-            if not proj1.alive():
-                continue
-            if not (0 <= proj1.x <= self.world_width and 0 <= proj1.y <= self.world_height):
-                proj1.kill()
-                continue
+        hit_slots = []
+        hit_times = []
+        hit_ships = []
+        for index in np.unique(pair_ships).tolist():
+            ship = ships[index]
+            slots = pair_slots[pair_ships == index]
+            times = self.projectile_time_of_impact(ship, projectiles, slots)
+            hit = times <= 1
+            hit_slots.append(slots[hit])
+            hit_times.append(times[hit])
+            hit_ships.append(np.full(np.count_nonzero(hit), index))
 
-            rect_collisions = pygame.sprite.spritecollide(proj1, all_ships, False, pygame.sprite.collide_rect)
-            for ship in rect_collisions:
-                if pygame.sprite.collide_mask(proj1, ship):
-                    ship.hullpoints -= 1
-                    proj1.kill()
-                    if ship.hullpoints <= 0:
-                        ship.kill()
-                    break
-            for proj2 in proj_list[i + 1:]:
-                if proj2.alive() and proj1.rect.colliderect(proj2.rect):
-                    if pygame.sprite.collide_mask(proj1, proj2):
-                        proj1.kill()
-                        proj2.kill()
+        if hit_slots:
+            slots = np.concatenate(hit_slots)
+            earliest = np.argsort(np.concatenate(hit_times), kind='stable')
+            slots, first = np.unique(slots[earliest], return_index=True)
+            for index in np.concatenate(hit_ships)[earliest][first].tolist():
+                ship = ships[index]
+                if not ship.alive():
+                    continue
+                ship.hullpoints -= 1
+                if ship.hullpoints <= 0:
+                    ship.kill()
+            hit_owners = projectiles.owner[slots]
+            projectiles.kill(slots)
+        else:
+            hit_owners = projectiles.owner[:0]
+
+        first, second = sweep.overlapping_pairs(projectiles, projectiles.radius * 2)
+        projectiles.kill(np.concatenate((first, second)))
+        return hit_owners
+
+    def projectile_time_of_impact(self, ship, projectiles, slots):
+        rad = math.radians(ship.angle)
+        cos_a = math.cos(rad)
+        sin_a = math.sin(rad)
+        end_x = projectiles.x[slots] - ship.x
+        end_y = projectiles.y[slots] - ship.y
+        start_x = end_x - (projectiles.x_vector[slots] - ship.x_vector)
+        start_y = end_y - (projectiles.y_vector[slots] - ship.y_vector)
+        p0_x = start_x * cos_a - start_y * sin_a
+        p0_y = start_x * sin_a + start_y * cos_a
+        r_x = end_x * cos_a - end_y * sin_a - p0_x
+        r_y = end_x * sin_a + end_y * cos_a - p0_y
+
+        times = np.full(len(slots), np.inf)
+        all_left = np.ones(len(slots), dtype=bool)
+        all_right = np.ones(len(slots), dtype=bool)
+        shape = ship.hull.shape
+        for (a_x, a_y), (b_x, b_y) in zip(shape, shape[1:] + shape[:1]):
+            e_x = b_x - a_x
+            e_y = b_y - a_y
+            q_x = a_x - p0_x
+            q_y = a_y - p0_y
+            side = q_y * e_x - q_x * e_y
+            all_left &= side <= 0
+            all_right &= side >= 0
+            denom = r_x * e_y - r_y * e_x
+            with np.errstate(divide='ignore', invalid='ignore'):
+                t = (q_x * e_y - q_y * e_x) / denom
+                u = (q_x * r_y - q_y * r_x) / denom
+            crossing = (denom != 0) & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+            times = np.where(crossing, np.minimum(times, t), times)
+        times[all_left | all_right] = 0
+        return times
 
     def check_world_bounds(self, ship):
         if ship.x < 0:
@@ -114,44 +458,664 @@ class Physics:
 
 
 class GameMaster:
-    def __init__(self, entities, world_width, world_height):
+    def __init__(self, entities, world_width, world_height, rng):
         self.entities = entities
         self.world_width = world_width
         self.world_height = world_height
+        self.rng = rng
 
     @classmethod
-    def create_for_gameloop(cls, entities, world_width, world_height):
-        return cls(entities, world_width, world_height)
+    def create_for_gameloop(cls, entities, world_width, world_height, rng=None):
+        return cls(entities, world_width, world_height, rng or random.Random())
 
-    def spawn_enemies(self, num_enemies, player_pos, difficulty, min_distance=300):
-        enemies = []
-        enemy_class = {
-            1: ['scout'],
-            2: ['scout', 'fighter'],
-            3: ['scout', 'fighter', 'heavy_fighter'],
-            4: ['fighter', 'heavy_fighter'],
-            5: ['heavy_fighter']
-        }
-        for _ in range(num_enemies):
-            while True:
-                x = random.randint(0, self.world_width)
-                y = random.randint(0, self.world_height)
-                distance = math.sqrt((x - player_pos[0]) ** 2 + (y - player_pos[1]) ** 2)
-                if distance >= min_distance:
-                    break
-            ship_class = random.choice(enemy_class[difficulty])
-            enemy = self.entities.Ship.create(x, y, 'enemy', ship_class)
-            enemies.append(enemy)
-        return enemies
+    def create_wave(self, num_enemies, player_pos, difficulty, min_distance=300, spacing=None):
+        if spacing is None:
+            free_area = max(self.world_width * self.world_height - math.pi * min_distance * min_distance, 1)
+            spacing = min(100, math.sqrt(free_area / (3 * max(num_enemies, 1))))
+        sampler = PoissonDiskSampler.create_for_wave(self.rng, self.world_width, self.world_height, player_pos,
+                                                     min_distance, spacing)
+        return EnemyWave.create_for_game_master(self.entities, self.rng, sampler, num_enemies, difficulty)
 
     def setup_game(self, all_ships, projectiles, player_pos, num_enemies, difficulty, player_ship_class='heavy_fighter'):
         all_ships.empty()
         projectiles.empty()
         player = self.entities.Ship.create(player_pos[0], player_pos[1], 'player', player_ship_class)
         all_ships.add(player)
-        enemies = self.spawn_enemies(num_enemies, player_pos, difficulty)
-        all_ships.add(enemies)
-        return player, enemies
+        return player, self.create_wave(num_enemies, player_pos, difficulty)
+
+
+class PoissonDiskSampler:
+    def __init__(self, rng, world_width, world_height, center, exclusion_radius, spacing, max_attempts):
+        self.rng = rng
+        self.world_width = world_width
+        self.world_height = world_height
+        self.center = center
+        self.exclusion_radius = exclusion_radius
+        self.spacing = spacing
+        self.max_attempts = max_attempts
+        self.cells = {}
+        self.points = []
+
+    @classmethod
+    def create_for_wave(cls, rng, world_width, world_height, center, exclusion_radius, spacing, max_attempts=30):
+        return cls(rng, world_width, world_height, center, exclusion_radius, spacing, max_attempts)
+
+    def add(self, x, y):
+        self.points.append((x, y))
+        key = (int(x // self.spacing), int(y // self.spacing))
+        cell = self.cells.get(key)
+        if cell is None:
+            self.cells[key] = [(x, y)]
+        else:
+            cell.append((x, y))
+
+    def is_free(self, x, y):
+        cell_x = int(x // self.spacing)
+        cell_y = int(y // self.spacing)
+        spacing_squared = self.spacing * self.spacing
+        for neighbour_x in (cell_x - 1, cell_x, cell_x + 1):
+            for neighbour_y in (cell_y - 1, cell_y, cell_y + 1):
+                for point_x, point_y in self.cells.get((neighbour_x, neighbour_y), ()):
+                    if (point_x - x) ** 2 + (point_y - y) ** 2 < spacing_squared:
+                        return False
+        return True
+
+    def sample(self):
+        center_x, center_y = self.center
+        exclusion_squared = self.exclusion_radius * self.exclusion_radius
+        candidate = None
+        for _ in range(self.max_attempts):
+            x = self.rng.uniform(0, self.world_width)
+            y = self.rng.uniform(0, self.world_height)
+            if (x - center_x) ** 2 + (y - center_y) ** 2 < exclusion_squared:
+                continue
+            candidate = (x, y)
+            if self.is_free(x, y):
+                break
+        if candidate is None:
+            angle = self.rng.uniform(0, 2 * math.pi)
+            candidate = (min(max(center_x + math.cos(angle) * self.exclusion_radius, 0), self.world_width),
+                         min(max(center_y + math.sin(angle) * self.exclusion_radius, 0), self.world_height))
+        self.add(*candidate)
+        return candidate
+
+
+class EnemyWave:
+    enemy_classes = {
+        1: ['scout'],
+        2: ['scout', 'fighter'],
+        3: ['scout', 'fighter', 'heavy_fighter'],
+        4: ['fighter', 'heavy_fighter'],
+        5: ['heavy_fighter']
+    }
+
+    def __init__(self, entities, rng, sampler, remaining, difficulty):
+        self.entities = entities
+        self.rng = rng
+        self.sampler = sampler
+        self.remaining = remaining
+        self.difficulty = difficulty
+
+    @classmethod
+    def create_for_game_master(cls, entities, rng, sampler, num_enemies, difficulty):
+        return cls(entities, rng, sampler, num_enemies, difficulty)
+
+    @property
+    def finished(self):
+        return self.remaining == 0
+
+    def spawn(self, count):
+        enemies = []
+        for _ in range(min(count, self.remaining)):
+            x, y = self.sampler.sample()
+            ship_class = self.rng.choice(self.enemy_classes[self.difficulty])
+            enemies.append(self.entities.Ship.create(x, y, 'enemy', ship_class))
+        self.remaining -= len(enemies)
+        return enemies
+
+
+class PhaseTimer:
+    def __init__(self):
+        self.frame = {}
+        self.history = []
+        self.recording = False
+        self.started = 0.0
+
+    @classmethod
+    def create_for_simulation(cls):
+        return cls()
+
+    def begin(self):
+        self.started = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.frame[phase] = self.frame.get(phase, 0.0) + now - self.started
+        self.started = now
+
+    def add(self, phase, seconds):
+        self.frame[phase] = self.frame.get(phase, 0.0) + seconds
+
+    def end_frame(self):
+        frame = self.frame
+        self.frame = {}
+        if self.recording:
+            self.history.append(frame)
+        return frame
+
+
+class FrameProfiler:
+    phases = ('spawn', 'ship_update', 'projectile_update', 'ship_collision', 'projectile_collision', 'ai',
+              'star_blit', 'sprites', 'hud')
+    phase_colors = {
+        'spawn': (255, 255, 255),
+        'ship_update': (80, 160, 255),
+        'projectile_update': (255, 255, 0),
+        'ship_collision': (255, 120, 0),
+        'projectile_collision': (255, 0, 120),
+        'ai': (160, 80, 255),
+        'star_blit': (120, 120, 120),
+        'sprites': (0, 200, 120),
+        'hud': (0, 255, 0)
+    }
+
+    def __init__(self, phase_timer, history_length, bar_width, graph_height, graph_ms):
+        self.phase_timer = phase_timer
+        self.history = collections.deque(maxlen=history_length)
+        self.bar_width = bar_width
+        self.graph_height = graph_height
+        self.graph_ms = graph_ms
+        self.graph = pygame.Surface((history_length * bar_width, graph_height), pygame.SRCALPHA)
+        self.graph.fill((0, 0, 0, 160))
+        self.font = pygame.font.SysFont(None, 20)
+        self.visible = False
+        self.frame_number = 0
+        self.csv_file = None
+        self.csv_writer = None
+        self.profile = None
+        self.profile_path = None
+        self.profile_frames_left = 0
+
+    @classmethod
+    def create_for_gameloop(cls, phase_timer, history_length=240, bar_width=2, graph_height=150, graph_ms=1000 / 30):
+        return cls(phase_timer, history_length, bar_width, graph_height, graph_ms)
+
+    def toggle_overlay(self):
+        self.visible = not self.visible
+
+    def start_csv(self, path):
+        self.stop_csv()
+        self.csv_file = open(path, 'w', newline='')
+        self.csv_writer = csv.writer(self.csv_file)
+        self.csv_writer.writerow(('frame', 'frame_ms') + self.phases)
+
+    def stop_csv(self):
+        if self.csv_file is None:
+            return
+        self.csv_file.close()
+        self.csv_file = None
+        self.csv_writer = None
+
+    def toggle_csv(self, path):
+        if self.csv_file is None:
+            self.start_csv(path)
+        else:
+            self.stop_csv()
+
+    def capture_profile(self, frames, path):
+        if self.profile is not None:
+            return
+        self.profile = cProfile.Profile()
+        self.profile_path = path
+        self.profile_frames_left = frames
+        self.profile.enable()
+
+    def _finish_profile(self):
+        self.profile.disable()
+        self.profile.dump_stats(self.profile_path)
+        self.profile = None
+
+    def close(self):
+        self.stop_csv()
+        if self.profile is not None:
+            self._finish_profile()
+
+    def end_frame(self, frame_ms):
+        phases = self.phase_timer.end_frame()
+        phase_ms = [phases.get(phase, 0.0) * 1000 for phase in self.phases]
+        self.history.append((frame_ms, phase_ms))
+        self.frame_number += 1
+        if self.csv_writer is not None:
+            self.csv_writer.writerow([self.frame_number, round(frame_ms, 3)] + [round(ms, 3) for ms in phase_ms])
+        if self.profile is not None:
+            self.profile_frames_left -= 1
+            if self.profile_frames_left <= 0:
+                self._finish_profile()
+        self._add_bar(frame_ms, phase_ms)
+
+    def _add_bar(self, frame_ms, phase_ms):
+        if not self.visible:
+            return
+        width, height = self.graph.get_size()
+        scale = self.graph_height / self.graph_ms
+        self.graph.scroll(-self.bar_width, 0)
+        self.graph.fill((0, 0, 0, 160), (width - self.bar_width, 0, self.bar_width, height))
+        bottom = height
+        for phase, ms in zip(self.phases, phase_ms):
+            bar_height = ms * scale
+            pygame.draw.rect(self.graph, self.phase_colors[phase],
+                             (width - self.bar_width, bottom - bar_height, self.bar_width, bar_height))
+            bottom -= bar_height
+        frame_top = height - frame_ms * scale
+        pygame.draw.rect(self.graph, (255, 255, 255), (width - self.bar_width, frame_top, self.bar_width, 1))
+
+    def draw(self, screen):
+        if not self.visible:
+            return []
+        width, height = self.graph.get_size()
+        origin_x, origin_y = 10, 10
+        rects = [screen.blit(self.graph, (origin_x, origin_y))]
+        budget_y = origin_y + height - (1000 / 60) * self.graph_height / self.graph_ms
+        rects.append(pygame.draw.line(screen, (255, 0, 0), (origin_x, budget_y), (origin_x + width, budget_y)))
+
+        count = len(self.history) or 1
+        average_frame = sum(frame_ms for frame_ms, _ in self.history) / count
+        lines = [(f'frame {average_frame:.2f} ms', (255, 255, 255))]
+        for index, phase in enumerate(self.phases):
+            average = sum(phase_ms[index] for _, phase_ms in self.history) / count
+            lines.append((f'{phase} {average:.2f} ms', self.phase_colors[phase]))
+        for row, (text, color) in enumerate(lines):
+            rects.append(screen.blit(self.font.render(text, True, color), (origin_x + width + 10, origin_y + row * 16)))
+        return rects
+
+
+class AIScheduler:
+    def __init__(self, think_budget, view_distance, near_distance, near_interval, far_interval):
+        self.think_budget = think_budget
+        self.view_distance = view_distance
+        self.near_distance = near_distance
+        self.near_interval = near_interval
+        self.far_interval = far_interval
+        self.stats = collections.Counter()
+
+    @classmethod
+    def create_for_simulation(cls, think_budget=256, view_distance=1200, near_distance=3000, near_interval=4,
+                              far_interval=12):
+        return cls(think_budget, view_distance, near_distance, near_interval, far_interval)
+
+    def schedule(self, ships, tick):
+        thinkers = []
+        coasting = []
+        for ship in ships:
+            if ship.next_think_tick <= tick:
+                thinkers.append(ship)
+            elif ship.coast_thrust:
+                coasting.append(ship)
+        stats = self.stats
+        stats['ticks'] += 1
+        stats['peak_due'] = max(stats['peak_due'], len(thinkers))
+        if len(thinkers) > self.think_budget:
+            thinkers.sort(key=lambda ship: ship.next_think_tick)
+            stats['deferred'] += len(thinkers) - self.think_budget
+            coasting.extend(ship for ship in thinkers[self.think_budget:] if ship.coast_thrust)
+            del thinkers[self.think_budget:]
+        stats['thinks'] += len(thinkers)
+        stats['coasted'] += len(ships) - len(thinkers)
+        return thinkers, coasting
+
+    def plan(self, ships, distance, thrusting, tick):
+        intervals = np.where(distance <= self.view_distance, 1,
+                             np.where(distance <= self.near_distance, self.near_interval, self.far_interval))
+        for index, (ship, interval, thrust) in enumerate(zip(ships, intervals.tolist(), thrusting.tolist())):
+            delay = interval if ship.next_think_tick else index % interval + 1
+            ship.next_think_tick = tick + delay
+            ship.coast_thrust = thrust
+
+    def reset_stats(self):
+        self.stats.clear()
+
+    def get_report(self):
+        stats = self.stats
+        ticks = stats['ticks']
+        decisions = stats['thinks'] + stats['coasted']
+        return {
+            'ticks': ticks,
+            'thinks': stats['thinks'],
+            'coasted': stats['coasted'],
+            'deferred': stats['deferred'],
+            'peak_due': stats['peak_due'],
+            'thinks_per_tick': stats['thinks'] / ticks if ticks else 0.0,
+            'skip_rate': stats['coasted'] / decisions if decisions else 0.0,
+        }
+
+
+class Simulation:
+    commands = ('forward', 'backward', 'strafe_left', 'strafe_right', 'turn_left', 'turn_right',
+                'brake', 'brake_rotation', 'fire')
+    spawns_per_tick = 64
+    hostile_factions = {'player': ('enemy',), 'ally': ('enemy',), 'enemy': ('player', 'ally')}
+
+    def __init__(self, entities, world_width, world_height):
+        self.entities = entities
+        self.world_width = world_width
+        self.world_height = world_height
+        self.rng = random.Random()
+        self.seed = None
+        self.difficulty = None
+        self.physics = Physics.create_for_gameloop(world_width, world_height)
+        self.game_master = GameMaster.create_for_gameloop(entities, world_width, world_height, self.rng)
+        self.fleet_auto_pilot = entities.FleetAutoPilot.create_for_simulation()
+        self.ai_scheduler = AIScheduler.create_for_simulation()
+        self.spatial_index = SpatialIndex.create_for_simulation()
+        self.all_ships = pygame.sprite.Group()
+        self.projectiles = entities.ProjectileSystem.create_for_gameloop(world_width, world_height)
+        self.phase_timer = PhaseTimer.create_for_simulation()
+        self.player = None
+        self.enemies = []
+        self.wave = None
+        self.pilots = {}
+        self.tick = 0
+        self.ship_factions = {}
+        self.shots_fired = collections.Counter()
+        self.shots_hit = collections.Counter()
+
+    @classmethod
+    def create_for_gameloop(cls, entities, world_width, world_height):
+        return cls(entities, world_width, world_height)
+
+    def start(self, ship_class, num_enemies, difficulty, seed=None):
+        if seed is None:
+            seed = random.getrandbits(32)
+        self.seed = seed
+        self.difficulty = difficulty
+        self.rng.seed(seed)
+        self.player, self.wave = self.game_master.setup_game(
+            self.all_ships, self.projectiles, (self.world_width // 2, self.world_height // 2), num_enemies, difficulty, ship_class
+        )
+        self.enemies = []
+        self.pilots = {0: self.player}
+        self.tick = 0
+        self.ship_factions = {self.player.ship_id: self.player.faction}
+        self.shots_fired.clear()
+        self.shots_hit.clear()
+        self.ai_scheduler.reset_stats()
+        self.spawn_wave()
+        self.spatial_index.rebuild(self.all_ships)
+
+    def spawn_wave(self):
+        enemies = self.wave.spawn(self.spawns_per_tick)
+        self.all_ships.add(enemies)
+        self.enemies.extend(enemies)
+        for enemy in enemies:
+            self.ship_factions[enemy.ship_id] = enemy.faction
+
+    def add_pilot(self, ship_class, faction='ally', spacing=150):
+        pilot_id = max(self.pilots) + 1
+        ship = self.entities.Ship.create(self.player.x + spacing * pilot_id, self.player.y, faction, ship_class)
+        self.all_ships.add(ship)
+        self.ship_factions[ship.ship_id] = faction
+        self.pilots[pilot_id] = ship
+        return pilot_id
+
+    def remove_pilot(self, pilot_id):
+        self.pilots.pop(pilot_id).kill()
+
+    def get_living_pilots(self):
+        return [ship for ship in self.pilots.values() if ship.alive()]
+
+    @property
+    def status(self):
+        if not self.get_living_pilots():
+            return 'game_over'
+        if len(self.enemies) == 0 and self.wave.finished:
+            return 'victory'
+        return 'playing'
+
+    def encode_commands(self, commands):
+        mask = 0
+        for bit, command in enumerate(self.commands):
+            if command in commands:
+                mask |= 1 << bit
+        return mask
+
+    def decode_commands(self, mask):
+        return {command for bit, command in enumerate(self.commands) if mask & (1 << bit)}
+
+    def apply_commands(self, ship, commands):
+        if 'forward' in commands:
+            ship.start_to_accelerate('forward')
+        if 'backward' in commands:
+            ship.start_to_accelerate('backward')
+        if 'strafe_left' in commands:
+            ship.start_to_accelerate('left')
+        if 'strafe_right' in commands:
+            ship.start_to_accelerate('right')
+        if 'turn_left' in commands:
+            ship.start_to_turn('left')
+        if 'turn_right' in commands:
+            ship.start_to_turn('right')
+        if 'brake' in commands:
+            ship.start_to_brake()
+        if 'brake_rotation' in commands:
+            ship.start_to_brake_rotation()
+        if 'fire' in commands:
+            self.shots_fired[ship.faction] += ship.fire(self.projectiles)
+
+    def step(self, commands, dt, pilot_commands=None):
+        if self.status != 'playing':
+            return
+        timer = self.phase_timer
+        timer.begin()
+        if not self.wave.finished:
+            self.spawn_wave()
+        timer.lap('spawn')
+        if self.player.alive():
+            self.apply_commands(self.player, commands)
+        for pilot_id, commands in (pilot_commands or {}).items():
+            ship = self.pilots.get(pilot_id)
+            if ship is not None and ship.alive():
+                self.apply_commands(ship, commands)
+        self.all_ships.update(dt)
+        timer.lap('ship_update')
+        self.projectiles.update()
+        timer.lap('projectile_update')
+        self.physics.check_for_ship_collision(self.all_ships)
+        timer.lap('ship_collision')
+        hit_owners = self.physics.check_for_projectile_collisions(self.projectiles, self.all_ships)
+        for owner in hit_owners.tolist():
+            if owner in self.ship_factions:
+                self.shots_hit[self.ship_factions[owner]] += 1
+        timer.lap('projectile_collision')
+        self.step_ai()
+        timer.lap('ai')
+        self.tick += 1
+
+    def step_ai(self):
+        combat_range = 500
+        optimal_alignment = 0.2
+        self.enemies[:] = [enemy for enemy in self.enemies if enemy.alive()]
+        self.spatial_index.rebuild(self.all_ships)
+        if not self.enemies:
+            return
+        thinkers, coasting = self.ai_scheduler.schedule(self.enemies, self.tick)
+        if coasting:
+            self.fleet_auto_pilot.coast(coasting)
+        if not thinkers:
+            return
+        target_x, target_y = self.get_enemy_targets(thinkers)
+        distance, alignment, thrusting = self.fleet_auto_pilot.navigate_to_target(thinkers, target_x, target_y)
+        self.ai_scheduler.plan(thinkers, distance, thrusting, self.tick)
+        in_range = distance < combat_range
+        aligned = alignment <= optimal_alignment
+        for index in np.flatnonzero(in_range & aligned).tolist():
+            self.shots_fired['enemy'] += thinkers[index].fire(self.projectiles)
+        hostiles = self.hostile_factions['enemy']
+        if self.spatial_index.count(hostiles) < 2:
+            return
+        firing_arc = optimal_alignment * 180
+        for index in np.flatnonzero(in_range & ~aligned).tolist():
+            ship = thinkers[index]
+            if self.spatial_index.within_cone(ship.x, ship.y, ship.heading_cos, -ship.heading_sin, combat_range,
+                                              firing_arc, hostiles):
+                self.shots_fired['enemy'] += ship.fire(self.projectiles)
+
+    def get_enemy_targets(self, ships):
+        hostiles = self.hostile_factions['enemy']
+        if self.spatial_index.count(hostiles) < 2:
+            targets = self.spatial_index.nearest(self.player.x, self.player.y, hostiles)
+            target = targets[0][1] if targets else self.player
+            return target.x, target.y
+        positions = np.array([(ship.x, ship.y) for ship in ships], dtype=float).reshape(-1, 2)
+        return self.spatial_index.nearest_positions(positions[:, 0], positions[:, 1], hostiles)
+
+
+class StarField:
+    def __init__(self, seed, tile_size, stars_per_tile, max_tiles):
+        self.seed = seed
+        self.tile_size = tile_size
+        self.stars_per_tile = stars_per_tile
+        self.max_tiles = max_tiles
+        self.tiles = collections.OrderedDict()
+
+    @classmethod
+    def create_for_gameloop(cls, seed=None, tile_size=512, star_density=1 / 8000, max_tiles=48):
+        if seed is None:
+            seed = random.getrandbits(32)
+        return cls(seed, tile_size, round(tile_size * tile_size * star_density), max_tiles)
+
+    def _tile_seed(self, tile_x, tile_y):
+        return (self.seed * 73856093) ^ (tile_x * 19349663) ^ (tile_y * 83492791)
+
+    def _create_tile(self, tile_x, tile_y):
+        rng = random.Random(self._tile_seed(tile_x, tile_y))
+        tile = pygame.Surface((self.tile_size, self.tile_size))
+        tile.fill((0, 0, 0))
+        for star in range(self.stars_per_tile):
+            pygame.draw.circle(tile, (255, 255, 255),
+                               (rng.randrange(self.tile_size), rng.randrange(self.tile_size)), 1)
+        return tile
+
+    def get_tile(self, tile_x, tile_y):
+        key = (tile_x, tile_y)
+        tile = self.tiles.get(key)
+        if tile is not None:
+            self.tiles.move_to_end(key)
+            return tile
+        tile = self._create_tile(tile_x, tile_y)
+        self.tiles[key] = tile
+        if len(self.tiles) > self.max_tiles:
+            self.tiles.popitem(last=False)
+        return tile
+
+    def draw(self, screen, camera_x, camera_y):
+        screen_width, screen_height = screen.get_size()
+        first_x = math.floor(camera_x / self.tile_size)
+        first_y = math.floor(camera_y / self.tile_size)
+        last_x = math.floor((camera_x + screen_width - 1) / self.tile_size)
+        last_y = math.floor((camera_y + screen_height - 1) / self.tile_size)
+        screen.blits([
+            (self.get_tile(tile_x, tile_y), (tile_x * self.tile_size - camera_x, tile_y * self.tile_size - camera_y))
+            for tile_y in range(first_y, last_y + 1)
+            for tile_x in range(first_x, last_x + 1)
+        ], False)
+
+
+class DirtyRectRenderer:
+    def __init__(self, screen_width, screen_height, enabled):
+        self.enabled = enabled
+        self.background = pygame.Surface((screen_width, screen_height)) if enabled else None
+        self.background_camera = None
+        self.previous_rects = []
+        self.rects = []
+        self.full = True
+
+    @classmethod
+    def create_for_gameloop(cls, screen_width, screen_height, enabled=False):
+        return cls(screen_width, screen_height, enabled)
+
+    def draw_background(self, screen, star_field, camera_x, camera_y):
+        if not self.enabled:
+            star_field.draw(screen, camera_x, camera_y)
+            return
+        camera = (int(camera_x), int(camera_y))
+        if self.full or camera != self.background_camera:
+            star_field.draw(self.background, camera_x, camera_y)
+            screen.blit(self.background, (0, 0))
+            self.background_camera = camera
+            self.full = True
+            return
+        screen.blits([(self.background, rect, rect) for rect in self.previous_rects], False)
+
+    def mark(self, rects):
+        if self.enabled:
+            self.rects.extend(rects)
+
+    def request_full(self):
+        self.full = True
+
+    def present(self):
+        if not self.enabled or self.full:
+            pygame.display.flip()
+        else:
+            pygame.display.update(self.previous_rects + self.rects)
+        self.previous_rects = self.rects
+        self.rects = []
+        self.full = False
+
+
+class TextCache:
+    def __init__(self, font, max_bytes):
+        self.font = font
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.entries = collections.OrderedDict()
+
+    @classmethod
+    def create_for_painter(cls, font, max_bytes=16 * 1024 * 1024):
+        return cls(font, max_bytes)
+
+    def get(self, key, build):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            return entry
+        entry = build()
+        self.entries[key] = entry
+        self.total_bytes += self._entry_bytes(entry)
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.total_bytes -= self._entry_bytes(evicted)
+        return entry
+
+    def _entry_bytes(self, entry):
+        surface = entry[0]
+        return surface.get_bytesize() * surface.get_width() * surface.get_height()
+
+    def render_text(self, text_str, color, alpha=200):
+        rgb_color = tuple(color[:3])
+        return self.get(('text', text_str, rgb_color, alpha),
+                        lambda: (self._render_transparent_text(text_str, rgb_color, alpha),))[0]
+
+    def _render_transparent_text(self, text_str, rgb_color, alpha):
+        text_surface = self.font.render(text_str, True, rgb_color)
+        transparent_surface = pygame.Surface(text_surface.get_size(), pygame.SRCALPHA)
+        transparent_surface.fill(rgb_color + (alpha,))
+        transparent_surface.blit(text_surface, (0, 0), special_flags=pygame.BLEND_RGBA_MULT)
+        return transparent_surface
+
+    def render_overlay(self, key, texts):
+        return self.get(('overlay', key), lambda: self._compose_overlay(texts))
+
+    def _compose_overlay(self, texts):
+        placed = []
+        for text_str, center_pos, color in texts:
+            text_surface = self.render_text(text_str, color)
+            placed.append((text_surface, text_surface.get_rect(center=center_pos)))
+        bounds = placed[0][1].unionall([text_rect for _, text_rect in placed[1:]])
+        overlay = pygame.Surface(bounds.size, pygame.SRCALPHA)
+        for text_surface, text_rect in placed:
+            overlay.blit(text_surface, text_rect.move(-bounds.left, -bounds.top))
+        return overlay, bounds.topleft
 
 
 class ScreenPainter:
@@ -161,27 +1125,15 @@ class ScreenPainter:
         self.screen_width = screen_width
         self.screen_height = screen_height
         self.font = pygame.font.SysFont(None, 48)
+        self.text_cache = TextCache.create_for_painter(self.font)
 
     @classmethod
     def create_for_gameloop(cls, screen_width, screen_height, world_width, world_height):
         return cls(screen_width, screen_height, world_width, world_height)
 
-    def create_a_star_surface(self):
-        star_surface = pygame.Surface((self.world_width, self.world_height))
-        star_surface.fill((0, 0, 0))
-        for star in range(8000):
-            pygame.draw.circle(star_surface, (255, 255, 255),
-                               (random.randint(0, self.world_width), random.randint(0, self.world_height)), 1)
-        return star_surface
-
-    def _render_transparent_text(self, text_str, center_pos, color):
-        rgb_color = color[:3] if len(color) == 4 else color
-        text_surface = self.font.render(text_str, True, rgb_color)
-        text_rect = text_surface.get_rect(center=center_pos)
-        transparent_surface = pygame.Surface(text_surface.get_size(), pygame.SRCALPHA)
-        transparent_surface.fill(rgb_color + (200,))
-        transparent_surface.blit(text_surface, (0, 0), special_flags=pygame.BLEND_RGBA_MULT)
-        return transparent_surface, text_rect
+    def _display_overlay(self, screen, key, texts):
+        overlay, position = self.text_cache.render_overlay(key, texts)
+        return screen.blit(overlay, position)
 
     def display_end_screen(self, screen, status):
         screen_text = {
@@ -189,33 +1141,30 @@ class ScreenPainter:
             'victory': ("Congratulations! - Press R to Advance", (255, 255, 0))
         }
         text_str, color = screen_text[status]
-        text_surface, text_rect = self._render_transparent_text(text_str, (self.screen_width // 2, self.screen_height // 2), color)
-        end_surface = pygame.Surface((self.screen_width, self.screen_height), pygame.SRCALPHA)
-        end_surface.blit(text_surface, text_rect)
-        screen.blit(end_surface, (0, 0))
+        return self._display_overlay(screen, status, [
+            (text_str, (self.screen_width // 2, self.screen_height // 2), color)
+        ])
 
     def display_menu(self, screen):
-        menu_surface = pygame.Surface((self.screen_width, self.screen_height), pygame.SRCALPHA)
         texts = [
             ("Select Ship Type:", (self.screen_width // 2, 300), (0, 255, 0)),
             ("1. Scout", (self.screen_width // 2, 360), (0, 255, 0)),
             ("2. Fighter", (self.screen_width // 2, 420), (0, 255, 0)),
             ("3. Heavy Fighter", (self.screen_width // 2, 480), (0, 255, 0))
         ]
-        for text_str, center_pos, color in texts:
-            text_surface, text_rect = self._render_transparent_text(text_str, center_pos, color)
-            menu_surface.blit(text_surface, text_rect)
-        screen.blit(menu_surface, (0, 0))
+        return self._display_overlay(screen, 'menu', texts)
+
+    def display_notice(self, screen, text):
+        return self._display_overlay(screen, ('notice', text), [
+            (text, (self.screen_width // 2, 60), (255, 160, 0))
+        ])
 
     def display_pause(self, screen):
-        pause_surface = pygame.Surface((self.screen_width, self.screen_height), pygame.SRCALPHA)
-        text_surface, text_rect = self._render_transparent_text(
-            "Paused - Press Esc to Resume or R to Restart",
-            (self.screen_width // 2, self.screen_height // 2),
-            (255, 255, 255)
-        )
-        pause_surface.blit(text_surface, text_rect)
-        screen.blit(pause_surface, (0, 0))
+        return self._display_overlay(screen, 'pause', [
+            ("Paused - Press Esc to Resume or R to Restart",
+             (self.screen_width // 2, self.screen_height // 2),
+             (255, 255, 255))
+        ])
 
 
 class HUD:
@@ -229,9 +1178,9 @@ class HUD:
         return cls(camera)
 
     def draw(self, screen, player, enemies):
-        self.hull_meter.draw(screen, player)
-        self.aiming_line.draw(screen, player)
-        self.offscreen_arrows.draw(screen, player, enemies)
+        rects = [self.hull_meter.draw(screen, player), self.aiming_line.draw(screen, player)]
+        rects.extend(self.offscreen_arrows.draw(screen, player, enemies))
+        return rects
 
 
 class HullMeter:
@@ -241,63 +1190,82 @@ class HullMeter:
         self.hull_width = 50
         self.hull_height = 5
         self.hull_offset_y = 25
+        self.layer = pygame.Surface((self.hull_width, self.hull_height), pygame.SRCALPHA)
+        self.layer_ratio = None
 
     @classmethod
     def create_for_hud(cls, camera):
         return cls(camera)
 
+    def _render_layer(self, hull_ratio):
+        self.layer.fill((0, 0, 0, 0))
+        pygame.draw.rect(self.layer, self.hull_color,
+                         (0, 0, self.hull_width * hull_ratio, self.hull_height))
+        pygame.draw.rect(self.layer, (100, 100, 100),
+                         (0, 0, self.hull_width, self.hull_height), 1)
+        self.layer_ratio = hull_ratio
+
     def draw(self, screen, player):
         player_coords = self.camera.get_ship_screen_coordinates(player)
         hull_ratio = player.hullpoints / player.ship_stats['max_hullpoints']
-        hull_current_width = self.hull_width * hull_ratio
+        if hull_ratio != self.layer_ratio:
+            self._render_layer(hull_ratio)
         hull_x = player_coords[0] - self.hull_width / 2
         hull_y = player_coords[1] + self.hull_offset_y
-        base_surface = pygame.Surface((self.hull_width, self.hull_height), pygame.SRCALPHA)
-        pygame.draw.rect(base_surface, self.hull_color,
-                         (0, 0, hull_current_width, self.hull_height))
-        pygame.draw.rect(base_surface, (100, 100, 100),
-                         (0, 0, self.hull_width, self.hull_height), 1)
-        screen.blit(base_surface, (hull_x, hull_y))
+        return screen.blit(self.layer, (hull_x, hull_y))
 
 
 class AimingLine:
     def __init__(self, camera):
         self.camera = camera
-        self.screen_width = camera.screen_width
-        self.screen_height = camera.screen_height
         self.aiming_line_color = (0, 255, 0, 200)
         self.aiming_line_start_offset = 50
         self.aiming_line_length = 150
         self.aiming_line_thickness = 1
+        self.angle_step = 0.5
+        self.layer = None
+        self.layer_key = None
 
     @classmethod
     def create_for_hud(cls, camera):
         return cls(camera)
 
-    def draw(self, screen, player):
-        line_surface = pygame.Surface((self.screen_width, self.screen_height), pygame.SRCALPHA)
-        player_coords = self.camera.get_ship_screen_coordinates(player)
-        rad = math.radians(player.angle)
+    def _render_layer(self, hardpoints, angle_index):
+        reach = self.aiming_line_length + max(math.hypot(hp_x, hp_y) for hp_x, hp_y in hardpoints) + self.aiming_line_thickness
+        size = math.ceil(reach) * 2
+        if self.layer is None or self.layer.get_width() < size:
+            self.layer = pygame.Surface((size, size), pygame.SRCALPHA)
+        self.layer.fill((0, 0, 0, 0))
+        center = self.layer.get_width() / 2
+        rad = math.radians(angle_index * self.angle_step)
         cos_a = math.cos(rad)
         sin_a = math.sin(rad)
 
-        for hp_x, hp_y in player.ship_stats['hardpoints']:
+        for hp_x, hp_y in hardpoints:
             hp_rot_x = hp_x * cos_a - hp_y * sin_a
             hp_rot_y = hp_x * sin_a + hp_y * cos_a
-            hp_screen_x = player_coords[0] + hp_rot_x
-            hp_screen_y = player_coords[1] - hp_rot_y
+            hp_layer_x = center + hp_rot_x
+            hp_layer_y = center - hp_rot_y
 
-            line_start_x = hp_screen_x + self.aiming_line_start_offset * cos_a
-            line_start_y = hp_screen_y - self.aiming_line_start_offset * sin_a
-            line_end_x = hp_screen_x + self.aiming_line_length * cos_a
-            line_end_y = hp_screen_y - self.aiming_line_length * sin_a
+            line_start_x = hp_layer_x + self.aiming_line_start_offset * cos_a
+            line_start_y = hp_layer_y - self.aiming_line_start_offset * sin_a
+            line_end_x = hp_layer_x + self.aiming_line_length * cos_a
+            line_end_y = hp_layer_y - self.aiming_line_length * sin_a
 
-            pygame.draw.line(line_surface, self.aiming_line_color,
+            pygame.draw.line(self.layer, self.aiming_line_color,
                              (line_start_x, line_start_y),
                              (line_end_x, line_end_y),
                              self.aiming_line_thickness)
+        self.layer_key = (tuple(hardpoints), angle_index)
 
-        screen.blit(line_surface, (0, 0))
+    def draw(self, screen, player):
+        hardpoints = player.ship_stats['hardpoints']
+        angle_index = round(player.get_interpolated_angle(self.camera.alpha) / self.angle_step) % round(360 / self.angle_step)
+        if self.layer_key != (tuple(hardpoints), angle_index):
+            self._render_layer(hardpoints, angle_index)
+        player_coords = self.camera.get_ship_screen_coordinates(player)
+        center = self.layer.get_width() / 2
+        return screen.blit(self.layer, (player_coords[0] - center, player_coords[1] - center))
 
 
 class OffscreenArrows:
@@ -308,54 +1276,19 @@ class OffscreenArrows:
         self.arrow_color = (255, 0, 0, 200)
         self.arrow_size = 8
         self.arrow_margin = 10
+        self.direction_buckets = 72
+        self.arrow_layers = {}
 
     @classmethod
     def create_for_hud(cls, camera):
         return cls(camera)
 
-    def _is_enemy_offscreen(self, enemy_screen_coords):
-        x, y = enemy_screen_coords
-        return not (0 <= x <= self.screen_width and 0 <= y <= self.screen_height)
-
-    def _calculate_direction_vector(self, player_coords, enemy_coords):
-        dx = enemy_coords[0] - player_coords[0]
-        dy = enemy_coords[1] - player_coords[1]
-        distance = math.sqrt(dx ** 2 + dy ** 2)
-        if distance < 1:
-            return None, None, None
-        nx = dx / distance
-        ny = dy / distance
-        return nx, ny, distance
-
-    def _calculate_t_values(self, player_coords, nx, ny):
-        t_left = (self.arrow_margin - player_coords[0]) / nx if nx != 0 else float('inf')
-        t_right = (self.screen_width - self.arrow_margin - player_coords[0]) / nx if nx != 0 else float('inf')
-        t_top = (self.arrow_margin - player_coords[1]) / ny if ny != 0 else float('inf')
-        t_bottom = (self.screen_height - self.arrow_margin - player_coords[1]) / ny if ny != 0 else float('inf')
-        return t_left, t_right, t_top, t_bottom
-
-    def _select_intersection_t(self, nx, ny, t_left, t_right, t_top, t_bottom):
-        t_values = []
-        if nx > 0 and t_right > 0:
-            t_values.append(t_right)
-        if nx < 0 < t_left:
-            t_values.append(t_left)
-        if ny > 0 and t_bottom > 0:
-            t_values.append(t_bottom)
-        if ny < 0 < t_top:
-            t_values.append(t_top)
-        return min(t_values) if t_values else None
-
-    def _calculate_intersection_point(self, player_coords, nx, ny, t):
-        intersect_x = player_coords[0] + nx * t
-        intersect_y = player_coords[1] + ny * t
-        intersect_x = max(self.arrow_margin, min(intersect_x, self.screen_width - self.arrow_margin))
-        intersect_y = max(self.arrow_margin, min(intersect_y, self.screen_height - self.arrow_margin))
-        return intersect_x, intersect_y
-
-    def _draw_arrow(self, screen, intersect_x, intersect_y, nx, ny):
+    def _get_arrow_layer(self, bucket):
+        arrow_surface = self.arrow_layers.get(bucket)
+        if arrow_surface is not None:
+            return arrow_surface
         arrow_surface = pygame.Surface((self.arrow_size * 2, self.arrow_size * 2), pygame.SRCALPHA)
-        angle = math.degrees(math.atan2(-ny, nx)) + 180
+        angle = bucket * 360 / self.direction_buckets
         points = [
             (self.arrow_size, self.arrow_size),
             (self.arrow_size - self.arrow_size * math.cos(math.radians(angle + 150)),
@@ -364,27 +1297,48 @@ class OffscreenArrows:
              self.arrow_size + self.arrow_size * math.sin(math.radians(angle - 150)))
         ]
         pygame.draw.polygon(arrow_surface, self.arrow_color, points)
-        screen.blit(arrow_surface, (intersect_x - self.arrow_size, intersect_y - self.arrow_size))
+        self.arrow_layers[bucket] = arrow_surface
+        return arrow_surface
 
-    def draw(self, screen, player, enemies):
-        ship_coords = self.camera.get_multiple_ship_screen_coordinates([player] + list(enemies))
-        player_coords = ship_coords[player]
-
-        for enemy in enemies:
-            if not enemy.alive():
-                continue
-            enemy_coords = ship_coords[enemy]
-            if not self._is_enemy_offscreen(enemy_coords):
-                continue
+    def _calculate_arrow_positions(self, player_coords, enemy_coords):
+        x = enemy_coords[:, 0]
+        y = enemy_coords[:, 1]
+        offscreen = ~((0 <= x) & (x <= self.screen_width) & (0 <= y) & (y <= self.screen_height))
+        dx = x - player_coords[0]
+        dy = y - player_coords[1]
+        distance = np.hypot(dx, dy)
+        valid = offscreen & (distance >= 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            nx = np.where(valid, dx / distance, 0.0)
+            ny = np.where(valid, dy / distance, 0.0)
+            t_left = (self.arrow_margin - player_coords[0]) / nx
+            t_right = (self.screen_width - self.arrow_margin - player_coords[0]) / nx
+            t_top = (self.arrow_margin - player_coords[1]) / ny
+            t_bottom = (self.screen_height - self.arrow_margin - player_coords[1]) / ny
+        t = np.minimum.reduce([
+            np.where((nx > 0) & (t_right > 0), t_right, np.inf),
+            np.where((nx < 0) & (t_left > 0), t_left, np.inf),
+            np.where((ny > 0) & (t_bottom > 0), t_bottom, np.inf),
+            np.where((ny < 0) & (t_top > 0), t_top, np.inf)
+        ])
+        valid &= np.isfinite(t)
+        nx = nx[valid]
+        ny = ny[valid]
+        t = t[valid]
+        intersect_x = np.clip(player_coords[0] + nx * t, self.arrow_margin, self.screen_width - self.arrow_margin)
+        intersect_y = np.clip(player_coords[1] + ny * t, self.arrow_margin, self.screen_height - self.arrow_margin)
+        angle = np.degrees(np.arctan2(-ny, nx)) + 180
+        buckets = np.round(angle * self.direction_buckets / 360).astype(int) % self.direction_buckets
+        return intersect_x, intersect_y, buckets
 
-            nx, ny, distance = self._calculate_direction_vector(player_coords, enemy_coords)
-            if distance is None:
-                continue
-
-            t_left, t_right, t_top, t_bottom = self._calculate_t_values(player_coords, nx, ny)
-            t = self._select_intersection_t(nx, ny, t_left, t_right, t_top, t_bottom)
-            if t is None:
-                continue
-
-            intersect_x, intersect_y = self._calculate_intersection_point(player_coords, nx, ny, t)
-            self._draw_arrow(screen, intersect_x, intersect_y, nx, ny)
+    def draw(self, screen, player, enemies):
+        enemies = [enemy for enemy in enemies if enemy.alive()]
+        if not enemies:
+            return []
+        player_coords = self.camera.get_ship_screen_coordinates(player)
+        enemy_coords = np.array([self.camera.get_ship_screen_coordinates(enemy) for enemy in enemies])
+        intersect_x, intersect_y, buckets = self._calculate_arrow_positions(player_coords, enemy_coords)
+        return screen.blits([
+            (self._get_arrow_layer(bucket), (arrow_x - self.arrow_size, arrow_y - self.arrow_size))
+            for arrow_x, arrow_y, bucket in zip(intersect_x.tolist(), intersect_y.tolist(), buckets.tolist())
+        ])
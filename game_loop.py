@@ -1,48 +1,115 @@
+import argparse
+import math
 import pygame
 import entities
 import game_engine
+import replay
+import snapshot
 
 class Game:
-    def __init__(self, screen_width=1600, screen_height=900, world_width=8000, world_height=8000):
+    def __init__(self, screen_width=1600, screen_height=900, world_width=8000, world_height=8000,
+                 tick_rate=60, max_fps=144, max_steps_per_frame=5, timings_csv=None, dirty_rects=False,
+                 record_path=None, playback_speed=1.0, snapshot_path='quicksave.sfs'):
         pygame.init()
         self.screen_width = screen_width
         self.screen_height = screen_height
         self.world_width = world_width
         self.world_height = world_height
+        self.tick_rate = tick_rate
+        self.tick_ms = 1000 / tick_rate
+        self.max_fps = max_fps
+        self.max_steps_per_frame = max_steps_per_frame
+        self.accumulator = 0.0
         self.screen = pygame.display.set_mode((self.screen_width, self.screen_height))
         pygame.display.set_caption("Starlight Frontier")
         self.clock = pygame.time.Clock()
 
-        self.game_physics = game_engine.Physics.create_for_gameloop(self.world_width, self.world_height)
-        self.game_master = game_engine.GameMaster.create_for_gameloop(entities, self.world_width, self.world_height)
+        self.simulation = game_engine.Simulation.create_for_gameloop(entities, self.world_width, self.world_height)
         self.screen_painter = game_engine.ScreenPainter.create_for_gameloop(self.screen_width, self.screen_height, self.world_width, self.world_height)
-        self.star_surface = self.screen_painter.create_a_star_surface()
+        self.star_field = game_engine.StarField.create_for_gameloop()
+        self.renderer = game_engine.DirtyRectRenderer.create_for_gameloop(self.screen_width, self.screen_height, dirty_rects)
+        self.drawn_screen = None
+        self.profiler = game_engine.FrameProfiler.create_for_gameloop(self.simulation.phase_timer)
+        self.timings_csv = timings_csv or 'frame_timings.csv'
+        self.profile_frames = 300
+        self.profile_path = 'frame_profile.prof'
+        if timings_csv:
+            self.profiler.start_csv(timings_csv)
+        self.record_path = record_path
+        self.recorder = None
+        self.replay_player = None
+        self.playback_speed = playback_speed
+        self.seek_ticks = 10 * tick_rate
+        self.snapshot_path = snapshot_path
+        self.notice = None
+        self.notice_until = 0
+        self.notice_ms = 3000
 
         self.game_state = 'menu'
         self.difficulty = 1
-        self.all_ships = pygame.sprite.Group()
-        self.projectiles = pygame.sprite.Group()
-        self.player = None
-        self.enemies = []
         self.camera = None
         self.hud = None
+        self.key_bindings = {
+            pygame.K_w: 'forward',
+            pygame.K_s: 'backward',
+            pygame.K_q: 'strafe_left',
+            pygame.K_e: 'strafe_right',
+            pygame.K_a: 'turn_left',
+            pygame.K_d: 'turn_right',
+            pygame.K_x: 'brake',
+            pygame.K_z: 'brake_rotation',
+            pygame.K_SPACE: 'fire'
+        }
 
-    def start_game(self, ship_class):
-        number_of_enemies = 1
-        self.player, self.enemies = self.game_master.setup_game(
-            self.all_ships, self.projectiles, (self.world_width // 2, self.world_height // 2), number_of_enemies, self.difficulty, ship_class
-        )
+    @property
+    def player(self):
+        return self.simulation.player
+
+    @property
+    def enemies(self):
+        return self.simulation.enemies
+
+    def start_game(self, ship_class, number_of_enemies=1, seed=None):
+        self.simulation.start(ship_class, number_of_enemies, self.difficulty, seed)
+        self.accumulator = 0.0
+        self.attach_camera()
+        if self.record_path:
+            self.recorder = replay.ReplayRecorder.create_for_game(self.simulation, ship_class, number_of_enemies,
+                                                                  self.difficulty, self.tick_rate)
+
+    def start_replay(self, recording):
+        self.difficulty = recording.difficulty
+        self.replay_player = replay.ReplayPlayer.create_for_game(recording, self.simulation)
+        self.replay_player.start()
+        self.accumulator = 0.0
+        self.attach_camera()
+        self.game_state = 'playing'
+
+    def attach_camera(self):
         self.camera = game_engine.Camera.create_for_gameloop(self.screen_width, self.screen_height, self.player)
         self.hud = game_engine.HUD.create_for_gameloop(self.camera)
 
+    def _return_to_menu(self):
+        self._stop_replay()
+        self.game_state = 'menu'
+
+    def _stop_replay(self):
+        if self.recorder:
+            self.recorder.save(self.record_path)
+            self.recorder = None
+        self.replay_player = None
+
     def run(self):
         running = True
         while running:
-            dt = self.clock.get_time()
+            dt = self.clock.tick(self.max_fps)
             events = pygame.event.get()
             for event in events:
                 if event.type == pygame.QUIT:
                     running = False
+                if event.type == pygame.KEYDOWN:
+                    self._handle_profiler_keys(event.key)
+                    self._handle_snapshot_keys(event.key)
 
             if self.game_state == 'menu':
                 self._handle_menu(events)
@@ -51,11 +118,68 @@ class Game:
             if self.game_state == 'playing':
                 self._handle_playing(dt, events)
 
-            pygame.display.flip()
-            self.clock.tick(60)
+            self._draw_notice()
+            self.profiler.end_frame(dt)
+            self.renderer.mark(self.profiler.draw(self.screen))
+            self.renderer.present()
 
+        self._stop_replay()
+        self.profiler.close()
         pygame.quit()
 
+    def _handle_profiler_keys(self, key):
+        if key == pygame.K_F3:
+            self.profiler.toggle_overlay()
+            self.drawn_screen = None
+        if key == pygame.K_F4:
+            self.profiler.toggle_csv(self.timings_csv)
+        if key == pygame.K_F7:
+            self.profiler.capture_profile(self.profile_frames, self.profile_path)
+
+    def _handle_snapshot_keys(self, key):
+        if key == pygame.K_F5 and self.game_state in ('playing', 'paused') and not self.replay_player:
+            snapshot.WorldSnapshot.capture(self.simulation).save(self.snapshot_path)
+        if key == pygame.K_F9:
+            self.load_snapshot(self.snapshot_path)
+
+    def load_snapshot(self, path):
+        try:
+            loaded = snapshot.WorldSnapshot.load(path)
+            loaded.check(self.simulation)
+        except (OSError, ValueError) as error:
+            self.show_notice(f'Could not load {path}: {error}')
+            return
+        self._stop_replay()
+        loaded.restore(self.simulation)
+        self.difficulty = self.simulation.difficulty
+        self.accumulator = 0.0
+        self.attach_camera()
+        self.game_state = 'playing'
+        self.drawn_screen = None
+        self.renderer.request_full()
+
+    def show_notice(self, text):
+        self.notice = text
+        self.notice_until = pygame.time.get_ticks() + self.notice_ms
+
+    def _draw_notice(self):
+        if self.notice is None:
+            return
+        if pygame.time.get_ticks() >= self.notice_until:
+            self.notice = None
+            self.drawn_screen = None
+            self.renderer.request_full()
+            return
+        self.renderer.mark([self.screen_painter.display_notice(self.screen, self.notice)])
+
+    def _is_drawn(self, screen_name):
+        if (self.renderer.enabled and not self.profiler.visible and self.notice is None
+                and self.drawn_screen == screen_name):
+            return True
+        self.drawn_screen = screen_name
+        self.renderer.request_full()
+        return False
+
     def _handle_menu(self, events):
         for event in events:
             if event.type == pygame.KEYDOWN:
@@ -69,8 +193,9 @@ class Game:
                     self.start_game('heavy_fighter')
                     self.game_state = 'playing'
 
-        self.screen.fill((0, 0, 0))
-        self.screen.blit(self.star_surface, (-self.screen_width // 2, -self.screen_height // 2))
+        if self.game_state != 'menu' or self._is_drawn('menu'):
+            return
+        self.star_field.draw(self.screen, self.screen_width // 2, self.screen_height // 2)
         self.screen_painter.display_menu(self.screen)
 
     def _handle_paused(self, events):
@@ -80,17 +205,11 @@ class Game:
                     self.game_state = 'playing'
                 if event.key == pygame.K_r:
                     self.difficulty = 1
-                    self.game_state = 'menu'
-
-        self.screen.fill((0, 0, 0))
-        self.screen.blit(self.star_surface, (-self.camera.x, -self.camera.y))
-        for ship in self.all_ships:
-            ship.rect.center = (ship.x - self.camera.x, ship.y - self.camera.y)
-        for proj in self.projectiles:
-            proj.rect.center = (proj.x - self.camera.x, proj.y - self.camera.y)
-        self.all_ships.draw(self.screen)
-        self.projectiles.draw(self.screen)
-        self.hud.draw(self.screen, self.player, self.enemies)
+                    self._return_to_menu()
+
+        if self.game_state != 'paused' or self._is_drawn('paused'):
+            return
+        self.draw_world(self.accumulator / self.tick_ms)
         self.screen_painter.display_pause(self.screen)
 
     def _handle_playing(self, dt, events):
@@ -98,77 +217,90 @@ class Game:
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
                     self.game_state = 'paused'
+                if self.replay_player and event.key in (pygame.K_LEFT, pygame.K_RIGHT):
+                    direction = 1 if event.key == pygame.K_RIGHT else -1
+                    self.replay_player.seek(self.simulation.tick + direction * self.seek_ticks)
+                    self.accumulator = 0.0
+                    self.attach_camera()
+                    self.renderer.request_full()
 
-        if not self.player.alive():
-            self.screen_painter.display_end_screen(self.screen, 'game_over')
+        status = self.simulation.status
+        if status == 'game_over':
+            if not self._is_drawn('game_over'):
+                self.screen_painter.display_end_screen(self.screen, 'game_over')
             keys = pygame.key.get_pressed()
             if keys[pygame.K_r]:
                 self.difficulty = 1
-                self.game_state = 'menu'
+                self._return_to_menu()
             return
 
-        if len(self.enemies) == 0:
-            self.screen_painter.display_end_screen(self.screen, 'victory')
+        if status == 'victory':
+            if not self._is_drawn('victory'):
+                self.screen_painter.display_end_screen(self.screen, 'victory')
             keys = pygame.key.get_pressed()
             if keys[pygame.K_r]:
                 if self.difficulty < 5:
                     self.difficulty += 1
-                self.game_state = 'menu'
+                self._return_to_menu()
             return
 
+        keyboard_commands = self.read_commands()
+        speed = self.playback_speed if self.replay_player else 1
+        self.accumulator += dt * speed
+        max_steps = self.max_steps_per_frame * math.ceil(speed)
+        steps = 0
+        while self.accumulator >= self.tick_ms and self.simulation.status == 'playing':
+            if steps == max_steps or (self.replay_player and self.replay_player.finished):
+                self.accumulator = 0.0
+                break
+            commands = self.replay_player.next_commands() if self.replay_player else keyboard_commands
+            self.simulation.step(commands, self.tick_ms)
+            if self.recorder:
+                self.recorder.record(commands)
+            self.accumulator -= self.tick_ms
+            steps += 1
+        if self.drawn_screen is not None:
+            self.drawn_screen = None
+            self.renderer.request_full()
+        self.draw_world(self.accumulator / self.tick_ms)
+
+    def read_commands(self):
         keys = pygame.key.get_pressed()
-        if keys[pygame.K_w]:
-            self.player.start_to_accelerate('forward')
-        if keys[pygame.K_s]:
-            self.player.start_to_accelerate('backward')
-        if keys[pygame.K_q]:
-            self.player.start_to_accelerate('left')
-        if keys[pygame.K_e]:
-            self.player.start_to_accelerate('right')
-        if keys[pygame.K_a]:
-            self.player.start_to_turn('left')
-        if keys[pygame.K_d]:
-            self.player.start_to_turn('right')
-        if keys[pygame.K_x]:
-            self.player.start_to_brake()
-        if keys[pygame.K_z]:
-            self.player.start_to_brake_rotation()
-        if keys[pygame.K_SPACE]:
-            projs = self.player.fire()
-            for proj in projs:
-                self.projectiles.add(proj)
-
-        self.all_ships.update(dt)
-        self.projectiles.update()
-
-        self.game_physics.check_for_ship_collision(self.all_ships)
-        self.game_physics.check_for_projectile_collisions(self.projectiles, self.all_ships)
-
-        self.camera.update(self.world_width, self.world_height)
-
-        self.screen.fill((0, 0, 0))
-        self.screen.blit(self.star_surface, (-self.camera.x, -self.camera.y))
-        for ship in self.all_ships:
-            ship.rect.center = (ship.x - self.camera.x, ship.y - self.camera.y)
-        for proj in self.projectiles:
-            proj.rect.center = (proj.x - self.camera.x, proj.y - self.camera.y)
-        self.all_ships.draw(self.screen)
-        self.projectiles.draw(self.screen)
-        self.hud.draw (self.screen, self.player, self.enemies)
-
-        for enemy in self.enemies[:]:
-            combat_range = 500
-            optimal_alignment = 0.2
-            if not enemy.alive():
-                self.enemies.remove(enemy)
-                continue
-            distance, alignment = enemy.approach_target(self.player.x, self.player.y)
-            if distance < combat_range and alignment <= optimal_alignment:
-                projs = enemy.fire()
-                for proj in projs:
-                    self.projectiles.add(proj)
+        return {command for key, command in self.key_bindings.items() if keys[key]}
+
+    def draw_world(self, alpha=1.0):
+        timer = self.simulation.phase_timer
+        timer.begin()
+        self.camera.update(self.world_width, self.world_height, alpha)
+
+        self.renderer.draw_background(self.screen, self.star_field, self.camera.x, self.camera.y)
+        timer.lap('star_blit')
+        ship_blits = []
+        for ship, screen_x, screen_y in self.camera.get_visible_ships(self.simulation.all_ships):
+            frame = ship.get_frame(ship.get_interpolated_angle(alpha))
+            ship_blits.append((frame.image, (screen_x + frame.offset[0], screen_y + frame.offset[1])))
+        self.renderer.mark(self.screen.blits(ship_blits, self.renderer.enabled) or [])
+        self.renderer.mark(self.simulation.projectiles.draw(self.screen, self.camera.x, self.camera.y, alpha,
+                                                            self.renderer.enabled) or [])
+        timer.lap('sprites')
+        self.renderer.mark(self.hud.draw(self.screen, self.player, self.enemies))
+        timer.lap('hud')
 
 
 if __name__ == '__main__':
-    game = Game()
-    game.run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Starlight Frontier')
+    parser.add_argument('--dirty-rects', action='store_true', help='only push changed screen regions to the display')
+    parser.add_argument('--timings-csv', help='stream per-frame phase timings to this CSV file')
+    parser.add_argument('--record', help='record the inputs of each match to this replay file')
+    parser.add_argument('--replay', help='play back a recorded replay file')
+    parser.add_argument('--speed', type=float, default=1.0, help='replay playback speed multiplier')
+    args = parser.parse_args()
+    if args.replay:
+        recording = replay.Replay.load(args.replay)
+        game = Game(world_width=recording.world_width, world_height=recording.world_height,
+                    tick_rate=recording.tick_rate, timings_csv=args.timings_csv, dirty_rects=args.dirty_rects,
+                    playback_speed=args.speed)
+        game.start_replay(recording)
+    else:
+        game = Game(timings_csv=args.timings_csv, dirty_rects=args.dirty_rects, record_path=args.record)
+    game.run()
@@ -0,0 +1,681 @@
+import argparse
+import asyncio
+import collections
+import itertools
+import math
+import os
+import random
+import struct
+import sys
+import time
+
+import numpy as np
+import entities
+import game_engine
+
+
+class Protocol:
+    join = 1
+    leave = 2
+    inputs = 3
+    welcome = 4
+    snapshot = 5
+    join_message = struct.Struct('<BB')
+    leave_message = struct.Struct('<B')
+    input_header = struct.Struct('<BIIB')
+    welcome_message = struct.Struct('<BBiHII')
+    snapshot_header = struct.Struct('<BIIIBHHHH')
+    ship_classes = ('scout', 'fighter', 'heavy_fighter')
+    factions = ('player', 'enemy', 'ally')
+    statuses = ('playing', 'victory', 'game_over')
+    position_scale = 16
+    velocity_scale = 256
+    angle_scale = 65536 / 360
+    position_tolerance = 2.0
+    angle_tolerance = 3.0
+    ship_dtype = np.dtype([('ship_id', '<i4'), ('ship_class', 'u1'), ('faction', 'u1'), ('x', '<i4'), ('y', '<i4'),
+                           ('x_vector', '<i2'), ('y_vector', '<i2'), ('angle', '<u2'), ('angular_velocity', '<i2'),
+                           ('hullpoints', '<u2')])
+    projectile_dtype = np.dtype([('projectile_id', '<u4'), ('x', '<i4'), ('y', '<i4'), ('x_vector', '<i2'),
+                                 ('y_vector', '<i2'), ('born', '<u4'), ('expires', '<u4'), ('frame', '<u2')])
+    max_redundant_inputs = 16
+
+    @classmethod
+    def quantize_velocity(cls, value):
+        return max(-32768, min(32767, round(value * cls.velocity_scale)))
+
+    @classmethod
+    def extrapolate_ship(cls, record, elapsed):
+        return (record[3] / cls.position_scale + record[5] / cls.velocity_scale * elapsed,
+                record[4] / cls.position_scale + record[6] / cls.velocity_scale * elapsed,
+                (record[7] / cls.angle_scale + record[8] / cls.velocity_scale * elapsed) % 360)
+
+    @classmethod
+    def ship_drifted(cls, record, baseline, tick):
+        known = baseline.ships.get(record[0])
+        if known is None or known[1:3] != record[1:3] or known[9] != record[9]:
+            return True
+        x, y, angle = cls.extrapolate_ship(known, tick - baseline.ship_ticks[record[0]])
+        if math.hypot(x - record[3] / cls.position_scale, y - record[4] / cls.position_scale) > cls.position_tolerance:
+            return True
+        return abs((angle - record[7] / cls.angle_scale + 180) % 360 - 180) > cls.angle_tolerance
+
+    @classmethod
+    def diff_states(cls, state, baseline, own_ship_id):
+        changed = [record for ship_id, record in state.ships.items()
+                   if ship_id == own_ship_id or cls.ship_drifted(record, baseline, state.tick)]
+        removed = [ship_id for ship_id in baseline.ships if ship_id not in state.ships]
+        spawned = [record for projectile_id, record in state.projectiles.items()
+                   if projectile_id not in baseline.projectiles]
+        destroyed = [projectile_id for projectile_id, record in baseline.projectiles.items()
+                     if projectile_id not in state.projectiles and record[6] > state.tick]
+        return changed, removed, spawned, destroyed
+
+    @classmethod
+    def encode_snapshot(cls, state, baseline, last_input_seq, changed, removed, spawned, destroyed):
+        return b''.join([
+            cls.snapshot_header.pack(cls.snapshot, state.tick, baseline.tick, last_input_seq,
+                                     cls.statuses.index(state.status), len(changed), len(removed), len(spawned),
+                                     len(destroyed)),
+            np.array(changed, dtype=cls.ship_dtype).tobytes(),
+            np.array(removed, dtype='<i4').tobytes(),
+            np.array(spawned, dtype=cls.projectile_dtype).tobytes(),
+            np.array(destroyed, dtype='<u4').tobytes(),
+        ])
+
+    @classmethod
+    def decode_snapshot(cls, data):
+        _, tick, baseline_tick, last_input_seq, status, changed_count, removed_count, spawned_count, destroyed_count = \
+            cls.snapshot_header.unpack_from(data)
+        offset = cls.snapshot_header.size
+
+        def take(dtype, count):
+            nonlocal offset
+            values = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+            offset += values.nbytes
+            return values.tolist()
+
+        return (tick, baseline_tick, last_input_seq, cls.statuses[status], take(cls.ship_dtype, changed_count),
+                take('<i4', removed_count), take(cls.projectile_dtype, spawned_count), take('<u4', destroyed_count))
+
+
+class NetState:
+    def __init__(self, tick, status, ships, ship_ticks, projectiles):
+        self.tick = tick
+        self.status = status
+        self.ships = ships
+        self.ship_ticks = ship_ticks
+        self.projectiles = projectiles
+
+    @classmethod
+    def create_empty(cls):
+        return cls(0, 'playing', {}, {}, {})
+
+    def apply_delta(self, tick, status, changed, removed, spawned, destroyed):
+        ships = dict(self.ships)
+        ship_ticks = dict(self.ship_ticks)
+        for ship_id in removed:
+            ships.pop(ship_id, None)
+            ship_ticks.pop(ship_id, None)
+        for record in changed:
+            ships[record[0]] = record
+            ship_ticks[record[0]] = tick
+        projectiles = {projectile_id: record for projectile_id, record in self.projectiles.items() if record[6] > tick}
+        for projectile_id in destroyed:
+            projectiles.pop(projectile_id, None)
+        for record in spawned:
+            projectiles[record[0]] = record
+        return NetState(tick, status, ships, ship_ticks, projectiles)
+
+
+class ClientConnection:
+    def __init__(self, address, pilot_id, ship_id, max_backlog):
+        self.address = address
+        self.pilot_id = pilot_id
+        self.ship_id = ship_id
+        self.max_backlog = max_backlog
+        self.inputs = collections.deque()
+        self.newest_seq = 0
+        self.last_input_seq = 0
+        self.last_mask = 0
+        self.ack_tick = 0
+        self.sent = {}
+        self.last_heard = time.monotonic()
+        self.bytes_sent = 0
+        self.snapshots_sent = 0
+        self.largest_snapshot = 0
+
+    @classmethod
+    def create_for_server(cls, address, pilot_id, ship_id, max_backlog=8):
+        return cls(address, pilot_id, ship_id, max_backlog)
+
+    def receive_inputs(self, ack_tick, newest_seq, masks):
+        self.last_heard = time.monotonic()
+        self.ack_tick = max(self.ack_tick, ack_tick)
+        first_seq = newest_seq - len(masks) + 1
+        for seq, mask in enumerate(masks, first_seq):
+            if seq > self.newest_seq:
+                self.inputs.append((seq, mask))
+                self.newest_seq = seq
+
+    def next_mask(self):
+        while len(self.inputs) > self.max_backlog:
+            self.last_input_seq, self.last_mask = self.inputs.popleft()
+        if self.inputs:
+            self.last_input_seq, self.last_mask = self.inputs.popleft()
+        return self.last_mask
+
+
+class ServerProtocol(asyncio.DatagramProtocol):
+    def __init__(self, handler):
+        self.handler = handler
+
+    def datagram_received(self, data, address):
+        if data:
+            self.handler(data, address)
+
+
+class NetServer:
+    def __init__(self, simulation, tick_rate, snapshot_interval, history_length, client_timeout, max_datagram):
+        self.simulation = simulation
+        self.tick_rate = tick_rate
+        self.tick_ms = 1000 / tick_rate
+        self.snapshot_interval = snapshot_interval
+        self.history_length = history_length
+        self.client_timeout = client_timeout
+        self.max_datagram = max_datagram
+        self.clients = {}
+        self.projectile_keys = {}
+        self.projectile_ids = itertools.count(1)
+        self.transport = None
+        self.frame = 0
+
+    @classmethod
+    def create_for_host(cls, ship_class, num_enemies, difficulty, seed=None, world_width=8000, world_height=8000,
+                        tick_rate=60, snapshot_interval=2, history_length=32, client_timeout=5.0, max_datagram=1200):
+        simulation = game_engine.Simulation.create_for_gameloop(entities, world_width, world_height)
+        simulation.start(ship_class, num_enemies, difficulty, seed)
+        return cls(simulation, tick_rate, snapshot_interval, history_length, client_timeout, max_datagram)
+
+    async def listen(self, host, port):
+        loop = asyncio.get_running_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(lambda: ServerProtocol(self.handle_datagram),
+                                                                local_addr=(host, port))
+        return self.transport.get_extra_info('sockname')[1]
+
+    def close(self):
+        if self.transport:
+            self.transport.close()
+
+    def handle_datagram(self, data, address):
+        if not data:
+            return
+        kind = data[0]
+        client = self.clients.get(address)
+        if kind == Protocol.join and len(data) == Protocol.join_message.size:
+            if client is None:
+                _, ship_class = Protocol.join_message.unpack(data)
+                client = self.add_client(address, Protocol.ship_classes[ship_class % len(Protocol.ship_classes)])
+            self.send(client, Protocol.welcome_message.pack(Protocol.welcome, client.pilot_id, client.ship_id,
+                                                            self.tick_rate, self.simulation.world_width,
+                                                            self.simulation.world_height))
+        elif kind == Protocol.inputs and client is not None and len(data) >= Protocol.input_header.size:
+            _, ack_tick, newest_seq, count = Protocol.input_header.unpack_from(data)
+            if len(data) < Protocol.input_header.size + 2 * count:
+                return
+            masks = struct.unpack_from(f'<{count}H', data, Protocol.input_header.size)
+            client.receive_inputs(ack_tick, newest_seq, masks)
+        elif kind == Protocol.leave and client is not None:
+            self.remove_client(address)
+
+    def add_client(self, address, ship_class):
+        simulation = self.simulation
+        taken = {client.pilot_id for client in self.clients.values()}
+        if 0 not in taken:
+            pilot_id = 0
+        else:
+            pilot_id = simulation.add_pilot(ship_class)
+        client = ClientConnection.create_for_server(address, pilot_id, simulation.pilots[pilot_id].ship_id)
+        self.clients[address] = client
+        return client
+
+    def remove_client(self, address):
+        client = self.clients.pop(address)
+        if client.pilot_id != 0:
+            self.simulation.remove_pilot(client.pilot_id)
+
+    def send(self, client, data):
+        self.transport.sendto(data, client.address)
+
+    def step(self):
+        simulation = self.simulation
+        now = time.monotonic()
+        for address in [address for address, client in self.clients.items()
+                        if now - client.last_heard > self.client_timeout]:
+            self.remove_client(address)
+
+        pilot_commands = {client.pilot_id: simulation.decode_commands(client.next_mask())
+                          for client in self.clients.values()}
+        player_commands = pilot_commands.pop(0, set())
+        simulation.step(player_commands, self.tick_ms, pilot_commands)
+        self.frame += 1
+        if self.frame % self.snapshot_interval == 0:
+            self.send_snapshots()
+
+    def capture_state(self):
+        simulation = self.simulation
+        tick = simulation.tick
+        position_scale = Protocol.position_scale
+        quantize_velocity = Protocol.quantize_velocity
+        ships = {
+            ship.ship_id: (ship.ship_id, Protocol.ship_classes.index(ship.ship_class),
+                           Protocol.factions.index(ship.faction), round(ship.x * position_scale),
+                           round(ship.y * position_scale), quantize_velocity(ship.x_vector),
+                           quantize_velocity(ship.y_vector), round(ship.angle * Protocol.angle_scale) & 0xFFFF,
+                           quantize_velocity(ship.angular_velocity), max(0, ship.hullpoints))
+            for ship in simulation.all_ships
+        }
+
+        projectiles = simulation.projectiles
+        slots = projectiles.active_slots()
+        known = self.projectile_keys
+        current = {}
+        for slot, x, y, x_vector, y_vector, ttl, frame in zip(
+                slots.tolist(), projectiles.x[slots].tolist(), projectiles.y[slots].tolist(),
+                projectiles.x_vector[slots].tolist(), projectiles.y_vector[slots].tolist(),
+                projectiles.ttl[slots].tolist(), projectiles.frame[slots].tolist()):
+            key = (slot, tick + math.ceil(ttl), quantize_velocity(x_vector), quantize_velocity(y_vector))
+            record = known.get(key)
+            if record is None:
+                record = (next(self.projectile_ids), round(x * position_scale), round(y * position_scale),
+                          key[2], key[3], tick, key[1], frame)
+            current[key] = record
+        self.projectile_keys = current
+        return NetState(tick, simulation.status, ships, dict.fromkeys(ships, tick),
+                        {record[0]: record for record in current.values()})
+
+    def fit_snapshot(self, client, state, baseline):
+        changed, removed, spawned, destroyed = Protocol.diff_states(state, baseline, client.ship_id)
+        ship_ticks = baseline.ship_ticks
+        changed.sort(key=lambda record: (record[0] != client.ship_id, ship_ticks.get(record[0], -1)))
+        spawned.sort()
+        ship_size = Protocol.ship_dtype.itemsize
+        projectile_size = Protocol.projectile_dtype.itemsize
+        room = self.max_datagram - Protocol.snapshot_header.size
+        removed = removed[:room // 4]
+        room -= 4 * len(removed)
+        destroyed = destroyed[:room // 4]
+        room -= 4 * len(destroyed)
+        spawned = spawned[:(room - min(len(changed), room // 2 // ship_size) * ship_size) // projectile_size]
+        changed = changed[:(room - len(spawned) * projectile_size) // ship_size]
+        return changed, removed, spawned, destroyed
+
+    def send_snapshots(self):
+        state = self.capture_state()
+        oldest = state.tick - self.history_length * self.snapshot_interval
+        empty = NetState.create_empty()
+        for client in self.clients.values():
+            baseline = client.sent.get(client.ack_tick, empty)
+            delta = self.fit_snapshot(client, state, baseline)
+            data = Protocol.encode_snapshot(state, baseline, client.last_input_seq, *delta)
+            client.sent[state.tick] = baseline.apply_delta(state.tick, state.status, *delta)
+            for tick in [tick for tick in client.sent if tick < oldest]:
+                del client.sent[tick]
+            self.send(client, data)
+            client.bytes_sent += len(data)
+            client.snapshots_sent += 1
+            client.largest_snapshot = max(client.largest_snapshot, len(data))
+
+    async def run(self, frames=None):
+        loop = asyncio.get_running_loop()
+        tick_seconds = 1 / self.tick_rate
+        next_time = loop.time()
+        while frames is None or self.frame < frames:
+            self.step()
+            next_time += tick_seconds
+            await asyncio.sleep(max(0.0, next_time - loop.time()))
+
+
+class ClientProtocol(asyncio.DatagramProtocol):
+    def __init__(self, handler):
+        self.handler = handler
+
+    def datagram_received(self, data, address):
+        if data:
+            self.handler(data)
+
+
+class NetClient:
+    def __init__(self, simulation, ship_class, history_length):
+        self.simulation = simulation
+        self.ship_class = ship_class
+        self.history_length = history_length
+        self.transport = None
+        self.welcomed = None
+        self.pilot_id = None
+        self.ship_id = None
+        self.tick_rate = None
+        self.states = {}
+        self.latest_tick = 0
+        self.status = 'playing'
+        self.ships = {}
+        self.input_seq = 0
+        self.pending = collections.deque()
+        self.predictions = {}
+        self.prediction_errors = []
+        self.bytes_received = 0
+        self.snapshots_received = 0
+
+    @classmethod
+    def create_for_game(cls, simulation, ship_class='fighter', history_length=32):
+        return cls(simulation, ship_class, history_length)
+
+    @property
+    def own_ship(self):
+        return self.ships.get(self.ship_id)
+
+    async def connect(self, host, port, timeout=5.0, retry_interval=0.25):
+        loop = asyncio.get_running_loop()
+        self.welcomed = loop.create_future()
+        self.transport, _ = await loop.create_datagram_endpoint(lambda: ClientProtocol(self.handle_datagram),
+                                                                remote_addr=(host, port))
+        join = Protocol.join_message.pack(Protocol.join, Protocol.ship_classes.index(self.ship_class))
+        deadline = loop.time() + timeout
+        while not self.welcomed.done():
+            if loop.time() > deadline:
+                self.close()
+                raise ConnectionError(f'no answer from {host}:{port}')
+            self.transport.sendto(join)
+            try:
+                await asyncio.wait_for(asyncio.shield(self.welcomed), retry_interval)
+            except asyncio.TimeoutError:
+                pass
+        self.welcomed.result()
+
+    def close(self):
+        if self.transport:
+            self.transport.sendto(Protocol.leave_message.pack(Protocol.leave))
+            self.transport.close()
+            self.transport = None
+
+    def handle_datagram(self, data):
+        kind = data[0]
+        if kind == Protocol.welcome and not self.welcomed.done():
+            _, self.pilot_id, self.ship_id, self.tick_rate, world_width, world_height = \
+                Protocol.welcome_message.unpack(data)
+            simulation = self.simulation
+            if (world_width, world_height) != (simulation.world_width, simulation.world_height):
+                self.welcomed.set_exception(ValueError(
+                    f'server world is {world_width}x{world_height}, '
+                    f'client world is {simulation.world_width}x{simulation.world_height}'))
+                return
+            self.welcomed.set_result(None)
+        elif kind == Protocol.snapshot and self.pilot_id is not None:
+            self.bytes_received += len(data)
+            self.snapshots_received += 1
+            self.receive_snapshot(data)
+
+    def receive_snapshot(self, data):
+        tick, baseline_tick, last_input_seq, status, changed, removed, spawned, destroyed = \
+            Protocol.decode_snapshot(data)
+        if tick <= self.latest_tick:
+            return
+        baseline = self.states.get(baseline_tick) if baseline_tick else NetState.create_empty()
+        if baseline is None:
+            return
+        state = baseline.apply_delta(tick, status, changed, removed, spawned, destroyed)
+        self.states[tick] = state
+        self.latest_tick = tick
+        for old_tick in [old_tick for old_tick in self.states if old_tick < tick - self.history_length * 4]:
+            del self.states[old_tick]
+        self.status = status
+        self.synchronize(state, last_input_seq)
+
+    def synchronize(self, state, last_input_seq):
+        simulation = self.simulation
+        position_scale = Protocol.position_scale
+        velocity_scale = Protocol.velocity_scale
+        for ship_id in [ship_id for ship_id in self.ships if ship_id not in state.ships]:
+            self.ships.pop(ship_id).kill()
+        for record in state.ships.values():
+            ship_id, ship_class, faction, _, _, x_vector, y_vector, _, angular_velocity, hullpoints = record
+            x, y, angle = Protocol.extrapolate_ship(record, state.tick - state.ship_ticks[ship_id])
+            ship = self.ships.get(ship_id)
+            if ship is None:
+                ship = simulation.entities.ShipFactory.create_ship(x, y, Protocol.factions[faction],
+                                                                   Protocol.ship_classes[ship_class])
+                ship.ship_id = ship_id
+                ship.previous_x = ship.x
+                ship.previous_y = ship.y
+                self.ships[ship_id] = ship
+                simulation.all_ships.add(ship)
+            ship.x = x
+            ship.y = y
+            ship.x_vector = x_vector / velocity_scale
+            ship.y_vector = y_vector / velocity_scale
+            ship.angle = angle
+            ship.angular_velocity = angular_velocity / velocity_scale
+            ship.hullpoints = hullpoints
+            ship.refresh_heading()
+            ship.rect.center = (ship.x, ship.y)
+
+        ship = self.own_ship
+        if ship is not None:
+            predicted = self.predictions.get(last_input_seq)
+            if predicted is not None:
+                self.prediction_errors.append(math.hypot(predicted[0] - ship.x, predicted[1] - ship.y))
+            while self.pending and self.pending[0][0] <= last_input_seq:
+                self.predictions.pop(self.pending.popleft()[0], None)
+            for _, mask in self.pending:
+                self.predict(ship, mask)
+            simulation.player = ship
+            simulation.pilots = {self.pilot_id: ship}
+        simulation.enemies = [ship for ship in self.ships.values() if ship.faction == 'enemy']
+
+        tick = state.tick
+        records = np.array(list(state.projectiles.values()), dtype=Protocol.projectile_dtype)
+        age = tick - records['born'].astype(np.int64)
+        projectiles = simulation.projectiles
+        count = len(records)
+        capacity = max(64, 1 << count.bit_length())
+        x_vector = records['x_vector'] / velocity_scale
+        y_vector = records['y_vector'] / velocity_scale
+        projectiles.restore(capacity, count, range(capacity - 1, count - 1, -1), [], [
+            records['x'] / position_scale + x_vector * age,
+            records['y'] / position_scale + y_vector * age,
+            x_vector,
+            y_vector,
+            records['frame'] * projectiles.angle_step,
+            records['frame'],
+            np.full(count, -1),
+            records['expires'].astype(np.int64) - tick,
+            np.ones(count, dtype=bool),
+        ])
+
+    def predict(self, ship, mask):
+        simulation = self.simulation
+        simulation.apply_commands(ship, simulation.decode_commands(mask) - {'fire'})
+        ship.move()
+        simulation.physics.check_world_bounds(ship)
+
+    def tick(self, commands):
+        if self.transport is None:
+            return
+        simulation = self.simulation
+        self.input_seq += 1
+        mask = simulation.encode_commands(commands)
+        self.pending.append((self.input_seq, mask))
+        masks = [mask for _, mask in itertools.islice(reversed(self.pending), Protocol.max_redundant_inputs)]
+        masks.reverse()
+        self.transport.sendto(Protocol.input_header.pack(Protocol.inputs, self.latest_tick, self.input_seq,
+                                                         len(masks))
+                              + struct.pack(f'<{len(masks)}H', *masks))
+
+        own_ship = self.own_ship
+        for ship in self.ships.values():
+            if ship is own_ship:
+                self.predict(ship, mask)
+                self.predictions[self.input_seq] = (ship.x, ship.y)
+            else:
+                ship.move()
+                ship.rect.center = (ship.x, ship.y)
+        simulation.projectiles.update()
+
+
+class InputBot:
+    maneuvers = (('forward',), ('forward', 'turn_left'), ('forward', 'turn_right'), ('strafe_left',),
+                 ('strafe_right',), ('brake', 'turn_left'), ('brake_rotation',))
+
+    def __init__(self, rng, hold_ticks):
+        self.rng = rng
+        self.hold_ticks = hold_ticks
+        self.commands = set()
+        self.ticks_left = 0
+
+    @classmethod
+    def create_for_client(cls, seed, hold_ticks=30):
+        return cls(random.Random(seed), hold_ticks)
+
+    def think(self):
+        if self.ticks_left == 0:
+            self.commands = set(self.rng.choice(self.maneuvers)) | {'fire'}
+            self.ticks_left = self.hold_ticks
+        self.ticks_left -= 1
+        return self.commands
+
+
+async def run_bot_client(client, bot):
+    loop = asyncio.get_running_loop()
+    tick_seconds = 1 / client.tick_rate
+    next_time = loop.time()
+    while client.transport is not None:
+        client.tick(bot.think())
+        next_time += tick_seconds
+        await asyncio.sleep(max(0.0, next_time - loop.time()))
+
+
+async def run_local(args):
+    server = NetServer.create_for_host(args.ship_class, args.enemies, args.difficulty, args.seed,
+                                       args.world_size, args.world_size, args.tick_rate, args.snapshot_interval)
+    port = await server.listen('127.0.0.1', 0)
+    clients = []
+    for index in range(args.clients):
+        simulation = game_engine.Simulation.create_for_gameloop(entities, args.world_size, args.world_size)
+        client = NetClient.create_for_game(simulation, args.ship_class)
+        await client.connect('127.0.0.1', port)
+        clients.append(client)
+    bots = [asyncio.create_task(run_bot_client(client, InputBot.create_for_client(args.seed + index)))
+            for index, client in enumerate(clients)]
+
+    peak_projectiles = 0
+    started = time.perf_counter()
+    server_task = asyncio.create_task(server.run(args.ticks))
+    while not server_task.done():
+        peak_projectiles = max(peak_projectiles, len(server.simulation.projectiles))
+        await asyncio.sleep(0.1)
+    elapsed = time.perf_counter() - started
+    simulation = server.simulation
+    print(f'{args.ticks} ticks in {elapsed:.1f} s, {len(simulation.all_ships)} ships alive, '
+          f'peak {peak_projectiles} projectiles in flight, status {simulation.status}')
+    for connection in server.clients.values():
+        print(f'server to pilot {connection.pilot_id}: {connection.snapshots_sent} snapshots, '
+              f'{connection.bytes_sent / elapsed / 1024:.1f} KiB/s, largest {connection.largest_snapshot} bytes')
+    for client in clients:
+        client.close()
+    await asyncio.gather(server_task, *bots)
+    server.close()
+    for client in clients:
+        errors = client.prediction_errors or [0.0]
+        print(f'client pilot {client.pilot_id}: {client.snapshots_received} snapshots received, '
+              f'{client.bytes_received / elapsed / 1024:.1f} KiB/s, prediction error mean {np.mean(errors):.2f} px, '
+              f'max {max(errors):.2f} px')
+    return 0
+
+
+async def run_server(args):
+    server = NetServer.create_for_host(args.ship_class, args.enemies, args.difficulty, args.seed,
+                                       args.world_size, args.world_size, args.tick_rate, args.snapshot_interval)
+    port = await server.listen(args.host, args.port)
+    print(f'serving {args.world_size}x{args.world_size} on {args.host}:{port}')
+    try:
+        await server.run()
+    finally:
+        server.close()
+    return 0
+
+
+async def run_client(args):
+    import pygame
+    import game_loop
+
+    game = game_loop.Game(world_width=args.world_size, world_height=args.world_size, tick_rate=args.tick_rate)
+    client = NetClient.create_for_game(game.simulation, args.ship_class)
+    await client.connect(args.host, args.port)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + 5.0
+    while client.own_ship is None:
+        if loop.time() > deadline:
+            client.close()
+            raise ConnectionError(f'no snapshot from {args.host}:{args.port}')
+        await asyncio.sleep(0.01)
+    game.attach_camera()
+    game.game_state = 'playing'
+
+    running = True
+    accumulator = 0.0
+    while running:
+        dt = game.clock.tick(game.max_fps)
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                running = False
+
+        if client.status != 'playing':
+            game.screen_painter.display_end_screen(game.screen, client.status)
+            game.renderer.request_full()
+        else:
+            commands = game.read_commands()
+            accumulator = min(accumulator + dt, game.tick_ms * game.max_steps_per_frame)
+            while accumulator >= game.tick_ms:
+                client.tick(commands)
+                accumulator -= game.tick_ms
+            game.draw_world(accumulator / game.tick_ms)
+
+        game.profiler.end_frame(dt)
+        game.profiler.draw(game.screen)
+        game.renderer.present()
+        await asyncio.sleep(0)
+
+    client.close()
+    game.profiler.close()
+    pygame.quit()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Starlight Frontier multiplayer over UDP.')
+    parser.add_argument('mode', choices=['server', 'client', 'local'])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7777)
+    parser.add_argument('--ship-class', choices=['scout', 'fighter', 'heavy_fighter'], default='fighter')
+    parser.add_argument('--enemies', type=int, default=3)
+    parser.add_argument('--difficulty', type=int, choices=range(1, 6), default=1)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--world-size', type=int, default=8000)
+    parser.add_argument('--tick-rate', type=int, default=60)
+    parser.add_argument('--snapshot-interval', type=int, default=2, help='simulation ticks between snapshots')
+    parser.add_argument('--clients', type=int, default=2, help='bot clients in local mode')
+    parser.add_argument('--ticks', type=int, default=600, help='ticks to run in local mode')
+    args = parser.parse_args(argv)
+
+    if args.mode != 'client':
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    runners = {'server': run_server, 'client': run_client, 'local': run_local}
+    try:
+        return asyncio.run(runners[args.mode](args))
+    except KeyboardInterrupt:
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,226 @@
+import argparse
+import array
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+import entities
+import game_engine
+import snapshot
+
+
+class Replay:
+    magic = b'SFRP'
+    version = 4
+    header = struct.Struct('<4sHQ16sHBHIIIIII')
+    keyframe_header = struct.Struct('<III')
+    rng_words = 625
+
+    def __init__(self, seed, ship_class, num_enemies, difficulty, tick_rate, world_width, world_height,
+                 masks, counts, rng_states, keyframes):
+        self.seed = seed
+        self.ship_class = ship_class
+        self.num_enemies = num_enemies
+        self.difficulty = difficulty
+        self.tick_rate = tick_rate
+        self.world_width = world_width
+        self.world_height = world_height
+        self.masks = masks
+        self.counts = counts
+        self.rng_states = rng_states
+        self.keyframes = keyframes
+
+    @property
+    def tick_count(self):
+        return sum(self.counts)
+
+    def get_tick_masks(self):
+        return np.repeat(np.array(self.masks, dtype=np.uint16), np.array(self.counts, dtype=np.int64))
+
+    def save(self, path):
+        parts = [self.header.pack(self.magic, self.version, self.seed, self.ship_class.encode(), self.num_enemies,
+                                  self.difficulty, self.tick_rate, self.world_width, self.world_height,
+                                  self.tick_count, len(self.masks), len(self.rng_states), len(self.keyframes)),
+                 np.asarray(self.masks, '<u2').tobytes(), np.asarray(self.counts, '<u2').tobytes()]
+        for _, words, gauss_next in self.rng_states:
+            parts.append(np.asarray(words, '<u4').tobytes())
+            parts.append(struct.pack('<d', float('nan') if gauss_next is None else gauss_next))
+        for rng_index, keyframe in self.keyframes:
+            parts.append(self.keyframe_header.pack(keyframe.tick, rng_index, len(keyframe.data)))
+            parts.append(keyframe.data)
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'wb') as replay_file:
+            replay_file.write(b''.join(parts))
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as replay_file:
+            data = replay_file.read()
+        (magic, version, seed, ship_class, num_enemies, difficulty, tick_rate, world_width, world_height,
+         _, run_count, rng_count, keyframe_count) = cls.header.unpack_from(data)
+        if magic != cls.magic:
+            raise ValueError(f'{path} is not a replay file')
+        if version != cls.version:
+            raise ValueError(f'{path} has unsupported replay version {version}')
+        offset = cls.header.size
+        masks = array.array('H', np.frombuffer(data, '<u2', run_count, offset).tolist())
+        offset += run_count * 2
+        counts = array.array('H', np.frombuffer(data, '<u2', run_count, offset).tolist())
+        offset += run_count * 2
+
+        rng_states = []
+        for _ in range(rng_count):
+            words = np.frombuffer(data, '<u4', cls.rng_words, offset).tolist()
+            offset += cls.rng_words * 4
+            (gauss_next,) = struct.unpack_from('<d', data, offset)
+            offset += 8
+            rng_states.append((3, tuple(words), None if gauss_next != gauss_next else gauss_next))
+
+        keyframes = []
+        for _ in range(keyframe_count):
+            tick, rng_index, length = cls.keyframe_header.unpack_from(data, offset)
+            offset += cls.keyframe_header.size
+            keyframes.append((rng_index, snapshot.WorldSnapshot(data[offset:offset + length])))
+            offset += length
+
+        return cls(seed, ship_class.rstrip(b'\0').decode(), num_enemies, difficulty, tick_rate,
+                   world_width, world_height, masks, counts, rng_states, keyframes)
+
+
+class ReplayRecorder:
+    max_run = 0xFFFF
+
+    def __init__(self, simulation, replay, keyframe_interval):
+        self.simulation = simulation
+        self.replay = replay
+        self.keyframe_interval = keyframe_interval
+
+    @classmethod
+    def create_for_game(cls, simulation, ship_class, num_enemies, difficulty, tick_rate, keyframe_interval=600):
+        replay = Replay(simulation.seed, ship_class, num_enemies, difficulty, tick_rate,
+                        simulation.world_width, simulation.world_height,
+                        array.array('H'), array.array('H'), [], [])
+        return cls(simulation, replay, keyframe_interval)
+
+    def record(self, commands):
+        replay = self.replay
+        mask = self.simulation.encode_commands(commands)
+        if replay.masks and replay.masks[-1] == mask and replay.counts[-1] < self.max_run:
+            replay.counts[-1] += 1
+        else:
+            replay.masks.append(mask)
+            replay.counts.append(1)
+        if self.simulation.tick % self.keyframe_interval == 0:
+            self.add_keyframe()
+
+    def add_keyframe(self):
+        replay = self.replay
+        if replay.keyframes and replay.keyframes[-1][1].tick == self.simulation.tick:
+            return
+        rng_state = self.simulation.rng.getstate()
+        if not replay.rng_states or replay.rng_states[-1] != rng_state:
+            replay.rng_states.append(rng_state)
+        replay.keyframes.append((len(replay.rng_states) - 1,
+                                 snapshot.WorldSnapshot.capture(self.simulation, exact=True, include_rng=False)))
+
+    def save(self, path):
+        if self.simulation.tick:
+            self.add_keyframe()
+        self.replay.save(path)
+
+
+class ReplayPlayer:
+    def __init__(self, replay, simulation):
+        self.replay = replay
+        self.simulation = simulation
+        self.tick_masks = replay.get_tick_masks()
+        self.tick_ms = 1000 / replay.tick_rate
+
+    @classmethod
+    def create_for_game(cls, replay, simulation):
+        return cls(replay, simulation)
+
+    @property
+    def finished(self):
+        return self.simulation.tick >= len(self.tick_masks)
+
+    def start(self):
+        replay = self.replay
+        self.simulation.start(replay.ship_class, replay.num_enemies, replay.difficulty, replay.seed)
+
+    def next_commands(self):
+        tick = self.simulation.tick
+        if tick >= len(self.tick_masks):
+            return set()
+        return self.simulation.decode_commands(int(self.tick_masks[tick]))
+
+    def step(self):
+        self.simulation.step(self.next_commands(), self.tick_ms)
+
+    def seek(self, tick):
+        tick = max(0, min(tick, len(self.tick_masks)))
+        simulation = self.simulation
+        keyframe = None
+        rng_state = None
+        for rng_index, candidate in self.replay.keyframes:
+            if candidate.tick > tick:
+                break
+            keyframe = candidate
+            rng_state = self.replay.rng_states[rng_index]
+        if tick < simulation.tick or (keyframe is not None and keyframe.tick > simulation.tick):
+            if keyframe is None:
+                self.start()
+            else:
+                keyframe.restore(simulation)
+                simulation.rng.setstate(rng_state)
+        while simulation.tick < tick and simulation.status == 'playing':
+            self.step()
+
+    def verify(self):
+        if not self.replay.keyframes:
+            return None
+        expected = self.replay.keyframes[-1][1]
+        if self.simulation.tick != expected.tick:
+            return False
+        return snapshot.WorldSnapshot.capture(self.simulation, exact=True, include_rng=False).matches(expected)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Play back a Starlight Frontier replay without a display.')
+    parser.add_argument('path')
+    parser.add_argument('--seek', type=int, help='jump to this tick through the nearest keyframe before playing')
+    parser.add_argument('--to', type=int, help='stop at this tick instead of the end of the replay')
+    args = parser.parse_args(argv)
+
+    replay = Replay.load(args.path)
+    simulation = game_engine.Simulation.create_for_gameloop(entities, replay.world_width, replay.world_height)
+    player = ReplayPlayer.create_for_game(replay, simulation)
+    player.start()
+
+    started = time.perf_counter()
+    first_tick = simulation.tick
+    if args.seek:
+        player.seek(args.seek)
+    end = replay.tick_count if args.to is None else min(args.to, replay.tick_count)
+    while simulation.tick < end and simulation.status == 'playing':
+        player.step()
+    elapsed = time.perf_counter() - started
+
+    print(f'{os.path.getsize(args.path)} bytes, {len(replay.masks)} input runs, {len(replay.keyframes)} keyframes')
+    print(f'seed {replay.seed}, {replay.ship_class} vs {replay.num_enemies} enemies at difficulty {replay.difficulty}')
+    print(f'played to tick {simulation.tick}/{replay.tick_count} ({simulation.status}) in {elapsed:.2f} s, '
+          f'{(simulation.tick - first_tick) / replay.tick_rate / elapsed if elapsed > 0 else 0:.0f}x real time')
+    if simulation.tick != replay.tick_count:
+        return 0
+    verified = player.verify()
+    if verified is None:
+        return 0
+    print('final state matches the recording' if verified else 'final state DIVERGED from the recording')
+    return 0 if verified else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
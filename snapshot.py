@@ -0,0 +1,230 @@
+import itertools
+import os
+import struct
+import numpy as np
+
+
+class WorldSnapshot:
+    magic = b'SFSN'
+    version = 3
+    exact_flag = 1
+    rng_flag = 2
+    ship_classes = ('scout', 'fighter', 'heavy_fighter')
+    factions = ('player', 'enemy', 'ally')
+    pose_fields = ('x', 'y', 'previous_x', 'previous_y', 'angle', 'previous_angle',
+                   'x_vector', 'y_vector', 'angular_velocity')
+    projectile_float_fields = ('x', 'y', 'x_vector', 'y_vector', 'angle', 'ttl')
+    header = struct.Struct('<4sHBBIIQIiIIIIIIIIIddd')
+    owner_dtype = np.dtype([('ship_id', '<i4'), ('faction', 'u1')])
+    rng_words = 625
+
+    def __init__(self, data):
+        self.data = data
+
+    @classmethod
+    def get_ship_dtype(cls, float_type):
+        return np.dtype([('ship_id', '<i4'), ('ship_class', 'u1'), ('faction', 'u1'), ('alive', 'u1')]
+                        + [(name, float_type) for name in cls.pose_fields]
+                        + [('hullpoints', '<i4'), ('shoot_cooldown', float_type),
+                           ('next_think_tick', '<i4'), ('coast_thrust', 'u1')])
+
+    @classmethod
+    def get_projectile_dtype(cls, float_type):
+        return np.dtype([(name, float_type) for name in cls.projectile_float_fields]
+                        + [('frame', '<u2'), ('owner', '<i4'), ('active', 'u1')])
+
+    @classmethod
+    def capture(cls, simulation, exact=False, include_rng=True):
+        float_type = '<f8' if exact else '<f4'
+        ships = list(simulation.all_ships)
+        if not simulation.player.alive():
+            ships.append(simulation.player)
+        ship_records = np.array([
+            (ship.ship_id, cls.ship_classes.index(ship.ship_class), cls.factions.index(ship.faction), ship.alive(),
+             ship.x, ship.y, ship.previous_x, ship.previous_y, ship.angle, ship.previous_angle,
+             ship.x_vector, ship.y_vector, ship.angular_velocity, ship.hullpoints, ship.cannon.shoot_cooldown,
+             ship.next_think_tick, ship.coast_thrust)
+            for ship in ships
+        ], dtype=cls.get_ship_dtype(float_type))
+        owner_records = np.array([(ship_id, cls.factions.index(faction))
+                                  for ship_id, faction in simulation.ship_factions.items()], dtype=cls.owner_dtype)
+        shots = np.array([(simulation.shots_fired[faction], simulation.shots_hit[faction])
+                          for faction in cls.factions], dtype='<u4')
+
+        projectiles = simulation.projectiles
+        high_water = projectiles.high_water
+        projectile_records = np.zeros(high_water, dtype=cls.get_projectile_dtype(float_type))
+        for name in projectile_records.dtype.names:
+            projectile_records[name] = getattr(projectiles, name)[:high_water]
+        free_runs = cls.pack_descending_runs(projectiles.free_slots)
+        spawned = np.array(projectiles.spawned, dtype='<i4')
+        sweep_order = simulation.physics.projectile_sweep.order.astype('<i4')
+        wave = simulation.wave
+        wave_points = np.array([] if wave.finished else wave.sampler.points, dtype='<f8').reshape(-1, 2)
+
+        flags = (cls.exact_flag if exact else 0) | (cls.rng_flag if include_rng else 0)
+        parts = [cls.header.pack(cls.magic, cls.version, flags, simulation.difficulty,
+                                 simulation.world_width, simulation.world_height, simulation.seed, simulation.tick,
+                                 simulation.player.ship_id, len(ship_records), len(owner_records),
+                                 projectiles.capacity, high_water, len(free_runs) // 2, len(spawned), len(sweep_order),
+                                 wave.remaining, len(wave_points), *wave.sampler.center, wave.sampler.spacing),
+                 ship_records.tobytes(), owner_records.tobytes(), shots.tobytes(), projectile_records.tobytes(),
+                 free_runs.tobytes(), spawned.tobytes(), sweep_order.tobytes(), wave_points.tobytes()]
+        if include_rng:
+            _, words, gauss_next = simulation.rng.getstate()
+            parts.append(np.array(words, dtype='<u4').tobytes())
+            parts.append(struct.pack('<d', float('nan') if gauss_next is None else gauss_next))
+        return cls(b''.join(parts))
+
+    @staticmethod
+    def pack_descending_runs(values):
+        values = np.asarray(values, dtype=np.int64)
+        if len(values) == 0:
+            return np.zeros(0, dtype='<i4')
+        starts = np.flatnonzero(np.diff(values, prepend=values[0] + 2) != -1)
+        lengths = np.diff(starts, append=len(values))
+        return np.column_stack((values[starts], lengths)).astype('<i4').ravel()
+
+    @staticmethod
+    def unpack_descending_runs(runs):
+        runs = runs.reshape(-1, 2).tolist()
+        return np.concatenate([np.arange(start, start - length, -1) for start, length in runs] or [np.zeros(0)])
+
+    @property
+    def tick(self):
+        return self.header.unpack_from(self.data)[7]
+
+    def decode(self):
+        if len(self.data) < self.header.size:
+            raise ValueError('truncated world snapshot')
+        (magic, version, flags, difficulty, world_width, world_height, seed, tick, player_id, ship_count, owner_count,
+         capacity, high_water, free_run_count, spawned_count, sweep_count, wave_remaining, wave_point_count,
+         wave_center_x, wave_center_y, wave_spacing) = self.header.unpack_from(self.data)
+        if magic != self.magic:
+            raise ValueError('not a world snapshot')
+        if version != self.version:
+            raise ValueError(f'unsupported world snapshot version {version}')
+        float_type = '<f8' if flags & self.exact_flag else '<f4'
+        offset = self.header.size
+
+        def take(dtype, count):
+            nonlocal offset
+            values = np.frombuffer(self.data, dtype=dtype, count=count, offset=offset)
+            offset += values.nbytes
+            return values
+
+        state = {
+            'difficulty': difficulty, 'world_width': world_width, 'world_height': world_height, 'seed': seed,
+            'tick': tick, 'player_id': player_id, 'capacity': capacity, 'high_water': high_water,
+            'ships': take(self.get_ship_dtype(float_type), ship_count),
+            'owners': take(self.owner_dtype, owner_count),
+            'shots': take('<u4', len(self.factions) * 2).reshape(-1, 2),
+            'projectiles': take(self.get_projectile_dtype(float_type), high_water),
+            'free_slots': self.unpack_descending_runs(take('<i4', free_run_count * 2)),
+            'spawned': take('<i4', spawned_count),
+            'sweep_order': take('<i4', sweep_count),
+            'wave_remaining': wave_remaining,
+            'wave_center': (wave_center_x, wave_center_y),
+            'wave_spacing': wave_spacing,
+            'wave_points': take('<f8', wave_point_count * 2).reshape(-1, 2),
+            'rng_state': None,
+        }
+        if flags & self.rng_flag:
+            words = take('<u4', self.rng_words)
+            if len(self.data) < offset + 8:
+                raise ValueError('truncated world snapshot')
+            (gauss_next,) = struct.unpack_from('<d', self.data, offset)
+            state['rng_state'] = (3, tuple(words.tolist()), None if gauss_next != gauss_next else gauss_next)
+        return state
+
+    def check(self, simulation):
+        state = self.decode()
+        if (state['world_width'], state['world_height']) != (simulation.world_width, simulation.world_height):
+            raise ValueError(f'snapshot world is {state["world_width"]}x{state["world_height"]}, '
+                             f'simulation world is {simulation.world_width}x{simulation.world_height}')
+        return state
+
+    def restore(self, simulation):
+        state = self.check(simulation)
+        ship_factory = simulation.entities.ShipFactory
+        simulation.all_ships.empty()
+        player = None
+        enemies = []
+        allies = []
+        for record in state['ships']:
+            ship = ship_factory.create_ship(float(record['x']), float(record['y']), self.factions[record['faction']],
+                                            self.ship_classes[record['ship_class']])
+            ship.ship_id = int(record['ship_id'])
+            for name in self.pose_fields:
+                setattr(ship, name, float(record[name]))
+            ship.hullpoints = int(record['hullpoints'])
+            ship.cannon.shoot_cooldown = float(record['shoot_cooldown'])
+            ship.next_think_tick = int(record['next_think_tick'])
+            ship.coast_thrust = bool(record['coast_thrust'])
+            ship.refresh_heading()
+            if record['alive']:
+                simulation.all_ships.add(ship)
+            if ship.ship_id == state['player_id']:
+                player = ship
+            elif ship.faction == 'enemy':
+                enemies.append(ship)
+            else:
+                allies.append(ship)
+
+        projectiles = simulation.projectiles
+        records = state['projectiles']
+        projectiles.restore(state['capacity'], state['high_water'], state['free_slots'].astype(int).tolist(),
+                            state['spawned'].tolist(), [records[name] for name in projectiles.fields])
+        sweep = simulation.physics.projectile_sweep
+        sweep.order = state['sweep_order'].astype(np.intp)
+        sweep.sorted_x = projectiles.x[sweep.order]
+
+        simulation.player = player
+        simulation.enemies = enemies
+        simulation.pilots = {pilot_id: ship for pilot_id, ship in enumerate([player] + allies)}
+        simulation.wave = simulation.game_master.create_wave(state['wave_remaining'], state['wave_center'],
+                                                             state['difficulty'], spacing=state['wave_spacing'])
+        for x, y in state['wave_points'].tolist():
+            simulation.wave.sampler.add(x, y)
+        simulation.difficulty = state['difficulty']
+        simulation.seed = state['seed']
+        simulation.tick = state['tick']
+        simulation.ship_factions = {ship_id: self.factions[faction] for ship_id, faction in state['owners'].tolist()}
+        simulation.shots_fired.clear()
+        simulation.shots_hit.clear()
+        for faction, (fired, hit) in zip(self.factions, state['shots'].tolist()):
+            if fired:
+                simulation.shots_fired[faction] = fired
+            if hit:
+                simulation.shots_hit[faction] = hit
+        if state['rng_state'] is not None:
+            simulation.rng.setstate(state['rng_state'])
+        simulation.spatial_index.rebuild(simulation.all_ships)
+
+        last_id = max(simulation.ship_factions, default=0)
+        ship_class = simulation.entities.Ship
+        ship_class.id_counter = itertools.count(max(next(ship_class.id_counter), last_id + 1))
+
+    def matches(self, other):
+        mine = self.decode()
+        theirs = other.decode()
+        ship_fields = [name for name in mine['ships'].dtype.names if name != 'ship_id']
+        projectile_fields = [name for name in mine['projectiles'].dtype.names if name != 'owner']
+        return (mine['tick'] == theirs['tick']
+                and len(mine['ships']) == len(theirs['ships'])
+                and all(np.array_equal(mine['ships'][name], theirs['ships'][name]) for name in ship_fields)
+                and np.array_equal(mine['shots'], theirs['shots'])
+                and len(mine['projectiles']) == len(theirs['projectiles'])
+                and all(np.array_equal(mine['projectiles'][name], theirs['projectiles'][name])
+                        for name in projectile_fields))
+
+    def save(self, path):
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'wb') as snapshot_file:
+            snapshot_file.write(self.data)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as snapshot_file:
+            return cls(snapshot_file.read())
@@ -0,0 +1,209 @@
+import argparse
+import collections
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import entities
+import game_engine
+
+
+class PlayerBot:
+    def __init__(self, combat_range, optimal_alignment):
+        self.combat_range = combat_range
+        self.optimal_alignment = optimal_alignment
+
+    @classmethod
+    def create_for_match(cls, combat_range=500, optimal_alignment=0.2):
+        return cls(combat_range, optimal_alignment)
+
+    def think(self, simulation):
+        player = simulation.player
+        targets = simulation.spatial_index.nearest(player.x, player.y, simulation.hostile_factions[player.faction])
+        if not targets:
+            return set()
+        target = targets[0][1]
+        distance, alignment = player.approach_target(target.x, target.y)
+        if distance < self.combat_range and alignment <= self.optimal_alignment:
+            return {'fire'}
+        return set()
+
+
+class Match:
+    def __init__(self, seed, player_ship_class, difficulty, num_enemies, max_ticks, world_width, world_height, tick_ms):
+        self.seed = seed
+        self.player_ship_class = player_ship_class
+        self.difficulty = difficulty
+        self.num_enemies = num_enemies
+        self.max_ticks = max_ticks
+        self.world_width = world_width
+        self.world_height = world_height
+        self.tick_ms = tick_ms
+
+    @classmethod
+    def create_for_tournament(cls, seed, player_ship_class, difficulty, num_enemies, max_ticks,
+                              world_width=8000, world_height=8000, tick_rate=60):
+        return cls(seed, player_ship_class, difficulty, num_enemies, max_ticks, world_width, world_height,
+                   1000 / tick_rate)
+
+    def play(self, simulation):
+        simulation.start(self.player_ship_class, self.num_enemies, self.difficulty, self.seed)
+        bot = PlayerBot.create_for_match()
+        while simulation.status == 'playing' and simulation.tick < self.max_ticks:
+            simulation.step(bot.think(simulation), self.tick_ms)
+
+        winners = {'victory': 'player', 'game_over': 'enemy', 'playing': 'draw'}
+        player = simulation.player
+        return {
+            'seed': self.seed,
+            'player_ship_class': self.player_ship_class,
+            'difficulty': self.difficulty,
+            'enemies': self.num_enemies,
+            'winner': winners[simulation.status],
+            'ticks': simulation.tick,
+            'shots_fired': simulation.shots_fired['player'],
+            'shots_hit': simulation.shots_hit['player'],
+            'enemy_shots_fired': simulation.shots_fired['enemy'],
+            'enemy_shots_hit': simulation.shots_hit['enemy'],
+            'hull_remaining': player.hullpoints / player.ship_stats['max_hullpoints'],
+            'enemies_remaining': len(simulation.enemies),
+        }
+
+
+worker_simulations = {}
+
+
+def play_match(match):
+    key = (match.world_width, match.world_height)
+    simulation = worker_simulations.get(key)
+    if simulation is None:
+        simulation = game_engine.Simulation.create_for_gameloop(entities, match.world_width, match.world_height)
+        worker_simulations[key] = simulation
+    return match.play(simulation)
+
+
+class TournamentRunner:
+    def __init__(self, matches, workers, chunksize):
+        self.matches = matches
+        self.workers = workers
+        self.chunksize = chunksize
+
+    @classmethod
+    def create_from_args(cls, args):
+        ship_classes = args.ship_class or ['scout', 'fighter', 'heavy_fighter']
+        difficulties = args.difficulty or [1, 2, 3, 4, 5]
+        seeds = itertools.count(args.seed)
+        matches = [
+            Match.create_for_tournament(next(seeds), ship_class, difficulty, args.enemies, args.max_ticks,
+                                        args.world_size, args.world_size)
+            for ship_class in ship_classes
+            for difficulty in difficulties
+            for _ in range(args.matches)
+        ]
+        workers = args.workers or os.cpu_count() or 1
+        chunksize = max(1, len(matches) // (workers * 8))
+        return cls(matches, workers, chunksize)
+
+    def run(self):
+        started = time.perf_counter()
+        if self.workers == 1:
+            results = [play_match(match) for match in self.matches]
+        else:
+            with multiprocessing.Pool(self.workers) as pool:
+                results = list(pool.imap_unordered(play_match, self.matches, self.chunksize))
+        elapsed = time.perf_counter() - started
+        results.sort(key=lambda result: result['seed'])
+        return {
+            'meta': {
+                'matches': len(results),
+                'workers': self.workers,
+                'seconds': elapsed,
+                'matches_per_sec': len(results) / elapsed if elapsed > 0 else 0.0,
+            },
+            'report': TournamentReport.create_from_results(results).summarize(),
+            'matches': results,
+        }
+
+
+class TournamentReport:
+    def __init__(self, groups):
+        self.groups = groups
+
+    @classmethod
+    def create_from_results(cls, results):
+        groups = collections.defaultdict(list)
+        for result in results:
+            groups[(result['player_ship_class'], result['difficulty'])].append(result)
+        return cls(groups)
+
+    def summarize(self):
+        summary = []
+        for (ship_class, difficulty), results in sorted(self.groups.items()):
+            count = len(results)
+            winners = collections.Counter(result['winner'] for result in results)
+            shots_fired = sum(result['shots_fired'] for result in results)
+            shots_hit = sum(result['shots_hit'] for result in results)
+            enemy_shots_fired = sum(result['enemy_shots_fired'] for result in results)
+            enemy_shots_hit = sum(result['enemy_shots_hit'] for result in results)
+            summary.append({
+                'player_ship_class': ship_class,
+                'difficulty': difficulty,
+                'matches': count,
+                'win_rate': winners['player'] / count,
+                'loss_rate': winners['enemy'] / count,
+                'draw_rate': winners['draw'] / count,
+                'mean_ticks': sum(result['ticks'] for result in results) / count,
+                'accuracy': shots_hit / shots_fired if shots_fired else 0.0,
+                'enemy_accuracy': enemy_shots_hit / enemy_shots_fired if enemy_shots_fired else 0.0,
+                'mean_hull_remaining': sum(result['hull_remaining'] for result in results) / count,
+            })
+        return summary
+
+    def format_table(self):
+        lines = [f'{"class":<14}{"diff":>5}{"matches":>9}{"win":>7}{"loss":>7}{"draw":>7}'
+                 f'{"ticks":>9}{"acc":>7}{"e.acc":>7}{"hull":>7}']
+        for row in self.summarize():
+            lines.append(f'{row["player_ship_class"]:<14}{row["difficulty"]:>5}{row["matches"]:>9}'
+                         f'{row["win_rate"]:>7.1%}{row["loss_rate"]:>7.1%}{row["draw_rate"]:>7.1%}'
+                         f'{row["mean_ticks"]:>9.0f}{row["accuracy"]:>7.1%}{row["enemy_accuracy"]:>7.1%}'
+                         f'{row["mean_hull_remaining"]:>7.1%}')
+        return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run seeded headless Starlight Frontier matches with an AI player.')
+    parser.add_argument('--ship-class', action='append', choices=['scout', 'fighter', 'heavy_fighter'],
+                        help='player ship class to test (repeatable, default: all)')
+    parser.add_argument('--difficulty', action='append', type=int, choices=range(1, 6),
+                        help='enemy difficulty table to test (repeatable, default: all)')
+    parser.add_argument('--matches', type=int, default=20, help='matches per ship class and difficulty')
+    parser.add_argument('--enemies', type=int, default=3)
+    parser.add_argument('--max-ticks', type=int, default=60 * 60 * 3, help='ticks before a match is called a draw')
+    parser.add_argument('--world-size', type=int, default=8000)
+    parser.add_argument('--seed', type=int, default=1, help='seed of the first match, later matches count up')
+    parser.add_argument('--workers', type=int, help='worker processes (default: all cores)')
+    parser.add_argument('--output', help='write the report and per-match results to this JSON file')
+    args = parser.parse_args(argv)
+
+    runner = TournamentRunner.create_from_args(args)
+    results = runner.run()
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+    meta = results['meta']
+    print(TournamentReport.create_from_results(results['matches']).format_table())
+    print(f'{meta["matches"]} matches on {meta["workers"]} workers in {meta["seconds"]:.1f} s '
+          f'({meta["matches_per_sec"]:.1f} matches/s)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())